@@ -0,0 +1,167 @@
+import numpy as np
+from moviepy import VideoClip
+
+from text_renderer import Sprite
+
+# --- CONFIGURATION ---
+DEFAULT_ANIM_DURATION = 3.0  # Reveal animations finish within this many seconds
+
+
+class Animation:
+    """Parametric transforms applied to a cached cue sprite
+
+    Every transform is a cheap function of the time since the cue started:
+      - fade_in / fade_out: opacity ramps in seconds
+      - wipe: "ltr" or "rtl" reveal over ``duration``
+      - typewriter_steps: pixel widths a wipe snaps to (cluster prefix widths), for a typewriter reveal
+      - slide: (dx, dy) starting offset that eases to (0, 0) over ``duration``
+    """
+
+    def __init__(self, duration=DEFAULT_ANIM_DURATION, fade_in=0.0, fade_out=0.0, wipe=None, slide=None,
+                 typewriter_steps=None):
+        self.duration = duration
+        self.fade_in = fade_in
+        self.fade_out = fade_out
+        self.wipe = wipe
+        self.slide = slide
+        self.typewriter_steps = None if typewriter_steps is None else np.asarray(typewriter_steps)
+
+    def progress(self, t):
+        if self.duration <= 0:
+            return 1.0
+        return min(1.0, max(0.0, t / self.duration))
+
+    def opacity(self, t, cue_duration):
+        """Opacity in [0, 1] at cue time t"""
+        opacity = 1.0
+        if self.fade_in > 0:
+            opacity = min(opacity, max(0.0, t / self.fade_in))
+        if self.fade_out > 0:
+            opacity = min(opacity, max(0.0, (cue_duration - t) / self.fade_out))
+        return opacity
+
+    def visible_columns(self, t, width):
+        """(c0, c1) sprite columns shown at cue time t"""
+        if self.wipe is None:
+            return 0, width
+        visible = int(width * self.progress(t))
+        if self.typewriter_steps is not None and visible < width:
+            idx = np.searchsorted(self.typewriter_steps, visible, side="right") - 1
+            visible = int(self.typewriter_steps[idx]) if idx >= 0 else 0
+        return (width - visible, width) if self.wipe == "rtl" else (0, visible)
+
+    def offset(self, t):
+        """(dx, dy) slide offset at cue time t (ease-out)"""
+        if self.slide is None:
+            return 0, 0
+        remaining = (1.0 - self.progress(t)) ** 2
+        return self.slide[0] * remaining, self.slide[1] * remaining
+
+    def is_animating(self, t, cue_duration):
+        """True while any transform still changes the output"""
+        if t < self.fade_in:
+            return True
+        if self.fade_out > 0 and t > cue_duration - self.fade_out:
+            return True
+        return (self.wipe is not None or self.slide is not None) and t < self.duration
+
+
+class Cue:
+    """One cached sprite on screen from ``start`` for ``duration`` seconds with an Animation
+
+    ``frame_source(t)`` may replace the static sprite for cues whose pixels
+    change over time (e.g. word highlighting); it must keep the sprite size.
+    """
+
+    def __init__(self, sprite, animation=None, duration=None, x=0, y=0, start=0.0, frame_source=None, name=""):
+        self.sprite = sprite
+        self.animation = animation or Animation(duration=0)
+        self.duration = duration
+        self.x = x
+        self.y = y
+        self.start = start
+        self.frame_source = frame_source
+        self.name = name
+        self._rgba = None
+        self._empty = np.zeros((sprite.height, 1, 4), dtype=np.uint8)
+
+    @property
+    def end(self):
+        return self.start + self.duration
+
+    @property
+    def width(self):
+        return self.sprite.width
+
+    @property
+    def height(self):
+        return self.sprite.height
+
+    def place(self, x, y, start=None):
+        """Set the on-screen position (and optionally the start time); returns the cue for chaining"""
+        self.x, self.y = x, y
+        if start is not None:
+            self.start = start
+        return self
+
+    def is_playing(self, t):
+        return self.start <= t < self.end
+
+    def is_animating(self, t):
+        """True while the cue's pixels differ from its settled, fully revealed state"""
+        return self.frame_source is not None or self.animation.is_animating(t - self.start, self.duration)
+
+    def state(self, t):
+        """(columns (c0, c1), screen x, screen y, opacity) at cue time t"""
+        c0, c1 = self.animation.visible_columns(t, self.width)
+        dx, dy = self.animation.offset(t)
+        return (c0, c1), self.x + c0 + dx, self.y + dy, self.animation.opacity(t, self.duration)
+
+    def rgba(self, t):
+        """Full straight-alpha RGBA pixels at cue time t"""
+        if self.frame_source is not None:
+            return self.frame_source(t)
+        if self._rgba is None:
+            self._rgba = self.sprite.to_rgba()
+        return self._rgba
+
+    def frame(self, t):
+        """RGBA frame for moviepy at cue time t: a view of the visible columns, alpha scaled by opacity"""
+        (c0, c1), _, _, opacity = self.state(t)
+        if c1 <= c0:
+            return self._empty
+        pixels = self.rgba(t)[:, c0:c1]
+        if opacity < 1.0:
+            pixels = pixels.copy()
+            pixels[..., 3] = (pixels[..., 3] * opacity).astype(np.uint8)
+        return pixels
+
+    def position(self, t):
+        _, x, y, _ = self.state(t)
+        return x, y
+
+    def blend_onto(self, frame, t):
+        """Blend the cue into an RGB frame in place at global time t (no moviepy involved)"""
+        ct = t - self.start
+        (c0, c1), x, y, opacity = self.state(ct)
+        if c1 <= c0 or opacity <= 0:
+            return frame
+        sprite = self.sprite if self.frame_source is None else Sprite(self.frame_source(ct))
+        if (c0, c1) != (0, self.width):
+            sprite = Sprite(sprite.pixels[:, c0:c1], sprite.channel_order, sprite.premultiplied)
+        return sprite.blend_onto(frame, x, y, opacity)
+
+    def to_clip(self):
+        """A single moviepy clip evaluating the animation per frame, with no effect chain or mask clip"""
+        clip = VideoClip(self.frame, duration=self.duration).with_position(self.position).with_start(self.start)
+        clip.cue_name = self.name  # Label for render_profiler
+        return clip
+
+
+def typewriter_steps(sprite, padding=10):
+    """Reveal widths that snap a wipe to whole clusters, from a PIL sprite's layout"""
+    layout = sprite.layout
+    if layout is None:
+        return None
+    line = max(layout.lines, key=lambda l: l.width)
+    return np.asarray(line.prefix) + padding
@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+from urllib.parse import urlparse
+
+from moviepy.config import FFMPEG_BINARY
+
+from ffmpeg_io import DEFAULT_AUDIO_BITRATE, DEFAULT_AUDIO_CODEC
+
+# --- CONFIGURATION ---
+AUDIO_CACHE_DIR = "data/audio_cache"
+
+
+def reciter_key(json_file):
+    """Reciter and style of a surah's recitation, from its audio URL (e.g. "mishari_al_afasy-murattal")"""
+    with open(json_file, "r", encoding="utf-8") as f:
+        audio = json.load(f)["audio"]["audio_files"][0]
+    parts = [part for part in urlparse(audio["audio_url"]).path.split("/")[:-1] if part and part != "qdc"]
+    return "-".join(parts) or str(audio["id"])
+
+
+def cached_audio(audio_path, json_file, audio_codec=DEFAULT_AUDIO_CODEC, audio_bitrate=DEFAULT_AUDIO_BITRATE,
+                 cache_dir=AUDIO_CACHE_DIR):
+    """Path of the recitation transcoded once to an M4A for (surah, reciter), transcoding it when missing
+
+    Renders mux the returned file with audio_args("copy"), so the audio is
+    never decoded or encoded again, whatever the video style.
+    """
+    surah = os.path.splitext(os.path.basename(json_file))[0]
+    path = os.path.join(cache_dir, reciter_key(json_file), f"{surah}-{audio_codec}-{audio_bitrate}.m4a")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name and renamed, so concurrent renders never pick up a partial file
+        temp_path = f"{path}.{os.getpid()}.tmp.m4a"
+        print(f"Transcoding {audio_path} to {path}...")
+        subprocess.run([FFMPEG_BINARY, "-y", "-v", "error", "-i", audio_path, "-vn", "-map_metadata", "-1",
+                        "-c:a", audio_codec, "-b:a", audio_bitrate, "-movflags", "+faststart", temp_path], check=True)
+        os.replace(temp_path, path)
+    return path
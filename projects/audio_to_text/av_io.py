@@ -0,0 +1,204 @@
+from fractions import Fraction
+
+import numpy as np
+
+from ffmpeg_io import encoder_args, frame_shape
+from yuv_compositor import yuv420p_planes
+
+
+def _options(args):
+    """{"-preset": "medium", ...} from an ffmpeg argument list such as encoder_args()"""
+    return {args[idx]: args[idx + 1] for idx in range(0, len(args) - 1) if args[idx].startswith("-")}
+
+
+def _copy_planes(frame, out, size, pix_fmt):
+    """Copy a decoded frame's planes into a numpy buffer, dropping libav's line padding"""
+    if pix_fmt == "yuv420p":
+        targets = yuv420p_planes(out, size)
+    else:
+        targets = (out.reshape(size[1], -1),)
+    for plane, target in zip(frame.planes, targets):
+        source = np.frombuffer(plane, dtype=np.uint8).reshape(-1, plane.line_size)
+        np.copyto(target, source[:target.shape[0], :target.shape[1]])
+    return out
+
+
+class AvBackgroundReader:
+    """BackgroundReader on PyAV: decodes in process, straight into a reusable numpy frame
+
+    No pipe in between, so each frame is copied once (from libav's frame
+    into the buffer) instead of through a pipe write and read. Output frames
+    follow the ``fps`` grid like ffmpeg's fps filter: the latest decoded
+    frame at or before each output time is used, converted once.
+    """
+
+    def __init__(self, path, size, fps, loop=False, start=0.0, pix_fmt="rgb24", channels=3):
+        # Optional dependency, only needed when this backend is selected
+        import av
+        self.size = size
+        self.fps = fps
+        self.loop = loop
+        self.pix_fmt = pix_fmt
+        self.container = av.open(path)
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = "AUTO"
+        self.frame = np.empty(frame_shape(size, pix_fmt, channels), dtype=np.uint8)
+        self.frame_no = 0
+        self.start = start
+        self.offset = 0.0  # Added to decoded timestamps, grows by one period on every loop
+        self.period = None
+        self._decoded = self.container.decode(self.stream)
+        self._current = self._next = None
+        self._converted = None
+
+    def _decode(self):
+        """Next decoded frame with its looped timestamp, or None at end of stream"""
+        for _ in range(2):
+            for frame in self._decoded:
+                t = float(frame.pts * self.stream.time_base) + self.offset
+                self.period = max(self.period or 0.0, t - self.offset + 1.0 / float(self.stream.average_rate or 30))
+                return t, frame
+            if not self.loop or self.period is None:
+                return None
+            self.container.seek(0, stream=self.stream)
+            self._decoded = self.container.decode(self.stream)
+            self.offset += self.period
+        return None
+
+    def read(self, out=None):
+        """Read the next frame into the shared buffer (or ``out``); returns it, or None at end of stream"""
+        t = self.start + self.frame_no / self.fps
+        if self._next is None:
+            self._next = self._decode()
+        while self._next is not None and self._next[0] <= t + 1e-6:
+            self._current, self._converted = self._next, None
+            self._next = self._decode()
+        if self._current is None or (self._next is None and t >= self._current[0] + 1.0 / self.fps):
+            return None
+        if self._converted is None:
+            self._converted = self._current[1].reformat(width=self.size[0], height=self.size[1], format=self.pix_fmt)
+        self.frame_no += 1
+        return _copy_planes(self._converted, self.frame if out is None else out, self.size, self.pix_fmt)
+
+    def close(self):
+        self.container.close()
+
+
+class AvFrameWriter:
+    """FrameWriter on PyAV: encodes numpy frames in process and muxes the audio track
+
+    Takes the same video_args as FrameWriter (codec, preset, crf, tune,
+    threads are read from them). -force_key_frames is a CLI option libav
+    does not know, so those frames are marked as I-frames here instead.
+    The audio is stream-copied, or transcoded when audio_output_args name
+    another codec, and muxed as the video advances so the two tracks are
+    interleaved in the file.
+    """
+
+    def __init__(self, output_path, size, fps, audio_path=None, pix_fmt="rgb24", video_args=None,
+                 audio_output_args=None):
+        # Optional dependency, only needed when this backend is selected
+        import av
+        if pix_fmt == "yuv420p" and (size[0] % 2 or size[1] % 2):
+            raise ValueError(f"PyAV only takes yuv420p frames of even width and height, got {size[0]}x{size[1]}")
+        self.av = av
+        self.pix_fmt = pix_fmt
+        options = _options(video_args or encoder_args())
+        self.container = av.open(output_path, "w")
+        self.rate = Fraction(fps).limit_denominator(1001)  # Newer PyAV video streams have no .rate to read back
+        self.stream = self.container.add_stream(options.pop("-c:v", "libx264"), rate=self.rate)
+        self.stream.width, self.stream.height = size
+        self.stream.pix_fmt = options.pop("-pix_fmt", "yuv420p")
+        keyframes = options.pop("-force_key_frames", None)
+        self.keyframes = sorted(float(t) for t in keyframes.split(",")) if keyframes else []
+        self.next_keyframe = 0
+        # Newer PyAV takes the PictureType enum (a string raises TypeError), old versions the type's name
+        picture_types = getattr(av.video.frame, "PictureType", None)
+        self.keyframe_type = picture_types.I if picture_types is not None else "I"
+        threads = options.pop("-threads", None)
+        if threads:
+            self.stream.codec_context.thread_count = int(threads)
+        self.stream.options = {key.lstrip("-"): value for key, value in options.items()}
+        if self.keyframes:
+            # Forced I-frames must be IDR frames, or stream-copy cuts cannot start on them
+            self.stream.options["forced-idr"] = "1"
+        self.frame_no = 0
+
+        self.audio_input = self.audio_stream = None
+        self.audio_options = _options(audio_output_args or ["-c:a", "copy"])
+        if audio_path:
+            self.audio_input = av.open(audio_path)
+            source = self.audio_input.streams.audio[0]
+            codec = self.audio_options.get("-c:a", "copy")
+            if codec == "copy":
+                # PyAV 14 renamed add_stream(template=...)
+                add_from_template = getattr(self.container, "add_stream_from_template", None)
+                self.audio_stream = (add_from_template(source) if add_from_template
+                                     else self.container.add_stream(template=source))
+            else:
+                self.audio_stream = self.container.add_stream(codec, rate=source.rate)
+                if "-b:a" in self.audio_options:
+                    self.audio_stream.bit_rate = int(self.audio_options["-b:a"].rstrip("k")) * 1000
+            self.audio_packets = self._audio_packets()
+            self.pending_audio = None  # (time, packets) read past the last written frame
+
+    def write(self, frame, frame_no=None):
+        """Encode one frame; ``frame_no`` (output frame index, default the next one) skips ahead for VFR output"""
+        if frame_no is not None:
+            self.frame_no = frame_no
+        video_frame = self.av.VideoFrame.from_ndarray(frame if self.pix_fmt != "yuv420p" else
+                                                      frame.reshape(-1, self.stream.width), format=self.pix_fmt)
+        if self.pix_fmt != self.stream.pix_fmt:
+            video_frame = video_frame.reformat(format=self.stream.pix_fmt)
+        video_frame.pts = self.frame_no
+        t = self.frame_no / float(self.rate)
+        if self.next_keyframe < len(self.keyframes) and t >= self.keyframes[self.next_keyframe]:
+            # Like -force_key_frames: the first frame at or after each time is an I-frame
+            video_frame.pict_type = self.keyframe_type
+            while self.next_keyframe < len(self.keyframes) and t >= self.keyframes[self.next_keyframe]:
+                self.next_keyframe += 1
+        self.frame_no += 1
+        for packet in self.stream.encode(video_frame):
+            self.container.mux(packet)
+        if self.audio_input is not None:
+            self._mux_audio(t)
+
+    def _audio_packets(self):
+        """(time, packets) of the audio track in order: demuxed packets when copying, encoded ones otherwise"""
+        source = self.audio_input.streams.audio[0]
+        if self.audio_options.get("-c:a", "copy") == "copy":
+            for packet in self.audio_input.demux(source):
+                if packet.dts is None:
+                    continue
+                packet.stream = self.audio_stream
+                yield float((packet.dts if packet.pts is None else packet.pts) * source.time_base), [packet]
+            return
+        for frame in self.audio_input.decode(source):
+            t = frame.time or 0.0
+            frame.pts = None
+            yield t, self.audio_stream.encode(frame)
+
+    def _mux_audio(self, until):
+        """Mux the audio up to ``until`` seconds, keeping it level with the video"""
+        while True:
+            if self.pending_audio is None:
+                self.pending_audio = next(self.audio_packets, None)
+                if self.pending_audio is None:
+                    return
+            t, packets = self.pending_audio
+            if t > until:
+                return
+            for packet in packets:
+                self.container.mux(packet)
+            self.pending_audio = None
+
+    def close(self):
+        for packet in self.stream.encode(None):
+            self.container.mux(packet)
+        if self.audio_input is not None:
+            self._mux_audio(self.frame_no / float(self.rate))  # Like -shortest: no audio past the last frame
+            if self.audio_options.get("-c:a", "copy") != "copy":
+                for packet in self.audio_stream.encode(None):
+                    self.container.mux(packet)
+            self.audio_input.close()
+        self.container.close()
@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from moviepy.config import FFMPEG_BINARY
+
+from audio_cache import cached_audio
+from ayah_clips import verse_timings
+
+# --- CONFIGURATION ---
+BASE_JSON_PATH = "quran/{}.json"
+BASE_AUDIO_PATH = "data/{}.mp3"
+AYAH_AUDIO_DIR = "data/ayah_audio"
+AUDIO_FORMATS = ("mp3", "m4a")  # Byte ranges of the downloaded MP3, or stream copies of the cached AAC track
+
+# MPEG audio Layer III header tables, indexed by the header's bitrate / sample rate bits
+MPEG1_BITRATES = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+MPEG2_BITRATES = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _id3_size(data):
+    """Length of the ID3v2 tag at the start of data (0 when there is none)"""
+    if data[:3] != b"ID3" or len(data) < 10:
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    return size + 10 + (10 if data[5] & 0x10 else 0)
+
+
+def _frame_header(data, pos):
+    """(frame length, samples, sample rate) of the Layer III frame header at pos, or None"""
+    if pos + 4 > len(data) or data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+    version, layer = (data[pos + 1] >> 3) & 3, (data[pos + 1] >> 1) & 3
+    bitrate_idx, rate_idx, padding = data[pos + 2] >> 4, (data[pos + 2] >> 2) & 3, (data[pos + 2] >> 1) & 1
+    if version == 1 or layer != 1 or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None
+    sample_rate = SAMPLE_RATES[version][rate_idx]
+    if version == 3:
+        return 144000 * MPEG1_BITRATES[bitrate_idx] // sample_rate + padding, 1152, sample_rate
+    return 72000 * MPEG2_BITRATES[bitrate_idx] // sample_rate + padding, 576, sample_rate
+
+
+def mp3_frames(data):
+    """(byte offset of every audio frame + the end offset, seconds per frame) of an MP3 file's contents
+
+    Skips the ID3v2 tag and a leading Xing/Info/VBRI frame, which carries
+    no audio, and resynchronizes over junk between frames.
+    """
+    offsets = []
+    pos = end = _id3_size(data)
+    frame_seconds = None
+    while pos < len(data):
+        header = _frame_header(data, pos)
+        if header is None or pos + header[0] > len(data):
+            pos += 1
+            continue
+        length, samples, sample_rate = header
+        is_vbr_header = frame_seconds is None and any(tag in data[pos:pos + 64] for tag in (b"Xing", b"Info", b"VBRI"))
+        if not is_vbr_header:
+            offsets.append(pos)
+        frame_seconds = samples / sample_rate
+        pos = end = pos + length
+    if not offsets:
+        raise ValueError("No MPEG audio Layer III frames found")
+    return offsets + [end], frame_seconds
+
+
+def ayah_path(surah_number, verse_key, audio_format, audio_dir=AYAH_AUDIO_DIR):
+    return os.path.join(audio_dir, str(surah_number), f"{verse_key.replace(':', '_')}.{audio_format}")
+
+
+def slice_mp3(surah_number, audio_dir=AYAH_AUDIO_DIR):
+    """Cut the surah MP3 into one file per verse on frame boundaries; returns the surah's manifest entries
+
+    Every verse starts and ends on the frame boundary nearest its
+    timestamps, so consecutive verses share a boundary and the slices are
+    plain byte ranges of the source file (no decoding at all).
+    """
+    audio_path = BASE_AUDIO_PATH.format(surah_number)
+    with open(audio_path, "rb") as f:
+        data = f.read()
+    offsets, frame_seconds = mp3_frames(data)
+    frame_count = len(offsets) - 1
+    manifest = {}
+    for timing in verse_timings(BASE_JSON_PATH.format(surah_number)):
+        first = min(round(timing["timestamp_from"] / 1000 / frame_seconds), frame_count)
+        last = max(min(round(timing["timestamp_to"] / 1000 / frame_seconds), frame_count), first)
+        path = ayah_path(surah_number, timing["verse_key"], "mp3", audio_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data[offsets[first]:offsets[last]])
+        manifest[timing["verse_key"]] = {"file": path, "source": audio_path, "offset": offsets[first],
+                                         "length": offsets[last] - offsets[first],
+                                         "start_ms": round(first * frame_seconds * 1000),
+                                         "end_ms": round(last * frame_seconds * 1000)}
+    return manifest
+
+
+def slice_m4a(surah_number, audio_dir=AYAH_AUDIO_DIR):
+    """Cut the cached AAC track (see audio_cache) into one M4A per verse with -c:a copy"""
+    json_file = BASE_JSON_PATH.format(surah_number)
+    audio_path = cached_audio(BASE_AUDIO_PATH.format(surah_number), json_file)
+    manifest = {}
+    for timing in verse_timings(json_file):
+        path = ayah_path(surah_number, timing["verse_key"], "m4a", audio_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        start, end = timing["timestamp_from"] / 1000, timing["timestamp_to"] / 1000
+        subprocess.run([FFMPEG_BINARY, "-y", "-v", "error", "-ss", f"{start:.3f}", "-i", audio_path,
+                        "-t", f"{end - start:.3f}", "-vn", "-c:a", "copy", "-movflags", "+faststart", path],
+                       check=True)
+        manifest[timing["verse_key"]] = {"file": path, "source": audio_path, "start_ms": timing["timestamp_from"],
+                                         "end_ms": timing["timestamp_to"]}
+    return manifest
+
+
+def slice_surah(surah_number, audio_format="mp3", audio_dir=AYAH_AUDIO_DIR):
+    if not os.path.exists(BASE_AUDIO_PATH.format(surah_number)):
+        from quran_video_generator import download_audio
+        if not download_audio(BASE_JSON_PATH.format(surah_number), BASE_AUDIO_PATH.format(surah_number)):
+            return {}
+    if audio_format == "m4a":
+        return slice_m4a(surah_number, audio_dir)
+    return slice_mp3(surah_number, audio_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cut surah recitations into per-verse audio files without "
+                                                 "re-encoding.")
+    parser.add_argument("surahs", type=int, nargs="*", default=list(range(1, 115)),
+                        help="Surah numbers (default: the whole Quran)")
+    parser.add_argument("--format", dest="audio_format", choices=AUDIO_FORMATS, default="mp3",
+                        help="mp3: byte ranges of the downloaded MP3, m4a: stream copies of the cached AAC track")
+    parser.add_argument("--audio-dir", default=AYAH_AUDIO_DIR)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Surahs sliced in parallel")
+    args = parser.parse_args()
+
+    manifest = {}
+    with ProcessPoolExecutor(args.jobs) as pool:
+        futures = [pool.submit(slice_surah, surah_number, args.audio_format, args.audio_dir)
+                   for surah_number in args.surahs]
+        for surah_number, future in zip(args.surahs, futures):
+            verses = future.result()
+            manifest.update(verses)
+            print(f"Surah {surah_number}: {len(verses)} verses")
+
+    manifest_path = os.path.join(args.audio_dir, f"manifest-{args.audio_format}.json")
+    os.makedirs(args.audio_dir, exist_ok=True)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote {len(manifest)} verses to {manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import json
+import math
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from moviepy.config import FFMPEG_BINARY
+
+from ffmpeg_io import probe_video
+
+# --- CONFIGURATION ---
+BASE_JSON_PATH = "quran/{}.json"
+BASE_VIDEO_PATH = "data/{}-video.mp4"
+CLIP_DIR = "data/clips"
+
+
+def verse_timings(json_file):
+    with open(json_file, "r", encoding="utf-8") as f:
+        return json.load(f)["audio"]["audio_files"][0]["verse_timings"]
+
+
+def frame_time(ms, fps):
+    """Time of the first frame at or after ms, the frame a verse's subtitles appear on"""
+    return math.ceil(ms * fps / 1000 - 1e-6) / fps
+
+
+def keyframe_times(json_file, fps):
+    """-force_key_frames times that put a keyframe on the first frame of every verse
+
+    Half a frame early, so rounding the printed time never moves the
+    keyframe to the next frame.
+    """
+    return [max(frame_time(timing["timestamp_from"], fps) - 0.5 / fps, 0.0) for timing in verse_timings(json_file)]
+
+
+def clip_path(surah_number, first, last, clip_dir=CLIP_DIR):
+    name = f"{surah_number}_{first}" if first == last else f"{surah_number}_{first}-{last}"
+    return os.path.join(clip_dir, str(surah_number), f"{name}.mp4")
+
+
+def export_clip(video_path, output_path, start, end):
+    """Cut [start, end) out of a rendered video with -c copy; start must be on a keyframe"""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # Input seeking copies from the last keyframe at or before -ss, so seek just past start's keyframe
+    subprocess.run([FFMPEG_BINARY, "-y", "-v", "error", "-ss", f"{start + 0.001:.6f}", "-i", video_path,
+                    "-t", f"{end - start:.6f}", "-map", "0", "-c", "copy", "-avoid_negative_ts", "make_zero",
+                    "-movflags", "+faststart", output_path], check=True)
+    return output_path
+
+
+def verse_ranges(surah_number, first=None, last=None, join=False):
+    """(first, last, start ms, end ms) of each verse in [first, last], or of the whole range when join is set"""
+    timings = verse_timings(BASE_JSON_PATH.format(surah_number))
+    numbers = [int(timing["verse_key"].split(":")[1]) for timing in timings]
+    last = last or (first if first and not join else numbers[-1])
+    first = first or numbers[0]
+    selected = [(number, timing) for number, timing in zip(numbers, timings) if first <= number <= last]
+    if join:
+        return [(first, last, selected[0][1]["timestamp_from"], selected[-1][1]["timestamp_to"])]
+    return [(number, number, timing["timestamp_from"], timing["timestamp_to"]) for number, timing in selected]
+
+
+def export_surah(surah_number, first=None, last=None, join=False, clip_dir=CLIP_DIR, pool=None):
+    """Export the verses of one rendered surah (rendered with VERSE_KEYFRAMES); returns the clip paths"""
+    video_path = BASE_VIDEO_PATH.format(surah_number)
+    fps = probe_video(video_path).fps
+    jobs = [(video_path, clip_path(surah_number, first_verse, last_verse, clip_dir), frame_time(start, fps),
+             frame_time(end, fps))
+            for first_verse, last_verse, start, end in verse_ranges(surah_number, first, last, join)]
+    if pool is None:
+        return [export_clip(*job) for job in jobs]
+    return list(pool.map(lambda job: export_clip(*job), jobs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cut per-ayah clips out of rendered surah videos without "
+                                                 "re-encoding.")
+    parser.add_argument("surahs", type=int, nargs="*",
+                        help="Surah numbers (default: every surah with a rendered video)")
+    parser.add_argument("--from", dest="first", type=int, help="First verse (default: the first)")
+    parser.add_argument("--to", dest="last", type=int, help="Last verse (default: --from, or the last verse)")
+    parser.add_argument("--join", action="store_true", help="One clip for the whole verse range")
+    parser.add_argument("--clip-dir", default=CLIP_DIR)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                        help="Clips cut at the same time (stream copies are I/O-bound)")
+    args = parser.parse_args()
+    surahs = args.surahs or [n for n in range(1, 115) if os.path.exists(BASE_VIDEO_PATH.format(n))]
+
+    with ThreadPoolExecutor(args.jobs) as pool:
+        for surah_number in surahs:
+            paths = export_surah(surah_number, args.first, args.last, args.join, args.clip_dir, pool)
+            print(f"Surah {surah_number}: {len(paths)} clips in {os.path.join(args.clip_dir, str(surah_number))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import math
+import os
+import subprocess
+
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+
+from ffmpeg_io import BackgroundReader, frame_shape
+
+# --- CONFIGURATION ---
+BACKGROUND_CACHE_DIR = "data/background_cache"
+
+
+def cache_key(path, size, fps, pix_fmt):
+    """Names the decoded loop after the source file's identity and the decode parameters"""
+    stat = os.stat(path)
+    source = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{size[0]}x{size[1]}|{fps}|{pix_fmt}"
+    name = os.path.splitext(os.path.basename(path))[0]
+    return f"{name}-{size[0]}x{size[1]}-{fps}-{pix_fmt}-{hashlib.sha1(source.encode()).hexdigest()[:12]}"
+
+
+class BackgroundCache:
+    """One period of a background loop, decoded once to raw frames in a memory-mapped file
+
+    The file is written once per (source, size, fps, pix_fmt) and then only
+    mapped read-only, so every render process on the host shares the same
+    pages through the page cache. Frame n of a looped render is
+    ``frames[n % len(frames)]``.
+    """
+
+    def __init__(self, path, size, fps, pix_fmt="rgb24", cache_dir=BACKGROUND_CACHE_DIR):
+        self.shape = frame_shape(size, pix_fmt)
+        base = os.path.join(cache_dir, cache_key(path, size, fps, pix_fmt))
+        self.raw_path, self.meta_path = base + ".raw", base + ".json"
+        if not os.path.exists(self.meta_path):
+            self._build(path, size, fps, pix_fmt, cache_dir)
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            self.frame_count = json.load(f)["frames"]
+        self.frames = np.memmap(self.raw_path, dtype=np.uint8, mode="r", shape=(self.frame_count,) + self.shape)
+
+    def _build(self, path, size, fps, pix_fmt, cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written under temporary names and renamed, so concurrent builders never expose a partial file
+        temp_raw = f"{self.raw_path}.{os.getpid()}.tmp"
+        print(f"Decoding {path} into the background cache...")
+        subprocess.run([FFMPEG_BINARY, "-y", "-v", "error", "-i", path, "-an",
+                        "-vf", f"scale={size[0]}:{size[1]},fps={fps}", "-f", "rawvideo", "-pix_fmt", pix_fmt,
+                        temp_raw], check=True)
+        frames = os.path.getsize(temp_raw) // math.prod(self.shape)
+        os.replace(temp_raw, self.raw_path)
+        temp_meta = f"{self.meta_path}.{os.getpid()}.tmp"
+        with open(temp_meta, "w", encoding="utf-8") as f:
+            json.dump({"source": os.path.abspath(path), "frames": frames}, f)
+        os.replace(temp_meta, self.meta_path)
+
+    def __len__(self):
+        return self.frame_count
+
+    def frame(self, frame_no):
+        """Read-only view of the background at output frame frame_no of a looped render"""
+        return self.frames[frame_no % self.frame_count]
+
+
+class CachedBackgroundReader:
+    """BackgroundReader interface over a BackgroundCache: a memcpy per frame instead of a decode"""
+
+    def __init__(self, path, size, fps, start=0.0, pix_fmt="rgb24", cache_dir=BACKGROUND_CACHE_DIR):
+        self.size = size
+        self.fps = fps
+        self.cache = BackgroundCache(path, size, fps, pix_fmt, cache_dir)
+        self.frame_no = int(round(start * fps))
+        self.frame = np.empty(self.cache.shape, dtype=np.uint8)
+
+    def read(self, out=None):
+        """Copy the next looped frame into the shared buffer (or ``out``) and return it"""
+        frame = self.frame if out is None else out
+        np.copyto(frame, self.cache.frame(self.frame_no))
+        self.frame_no += 1
+        return frame
+
+    def close(self):
+        pass
+
+
+def open_background(path, size, fps, loop=False, start=0.0, pix_fmt="rgb24", intro_path=None, intro_seconds=0.0,
+                    cache=False, backend="ffmpeg"):
+    """A CachedBackgroundReader for looped backgrounds when ``cache`` is set, else a decoding BackgroundReader
+
+    The "pyav" backend decodes in process (av_io.AvBackgroundReader). Splicing in an intro (a baked
+    header's, see header_bake) needs the ffmpeg BackgroundReader, without the cache.
+    """
+    if intro_path and (cache or backend != "ffmpeg"):
+        raise ValueError("A background with an intro is read by ffmpeg only, without the background cache")
+    if cache and loop:
+        return CachedBackgroundReader(path, size, fps, start=start, pix_fmt=pix_fmt)
+    if backend == "pyav":
+        from av_io import AvBackgroundReader
+        return AvBackgroundReader(path, size, fps, loop=loop, start=start, pix_fmt=pix_fmt)
+    return BackgroundReader(path, size, fps, loop=loop, start=start, pix_fmt=pix_fmt, intro_path=intro_path,
+                            intro_seconds=intro_seconds)
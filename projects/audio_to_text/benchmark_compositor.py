@@ -0,0 +1,135 @@
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+import pysrt
+from moviepy.config import FFMPEG_BINARY
+
+import quran_video_generator as generator
+from clip_index import IndexedCompositeVideoClip
+from ffmpeg_filtergraph import render_filtergraph
+from ffmpeg_io import VideoInfo, encoder_args, probe_video
+from frame_compositor import render_cues
+from parallel_render import render_cues_parallel
+from text_renderer import get_renderer
+from variant_render import render_variants
+from vfr_render import render_cues_vfr, vfr_video_args
+
+
+def make_background(path, size, fps, seconds):
+    """Synthetic moving background with a sine tone, standing in for the looped Canva video"""
+    subprocess.run([FFMPEG_BINARY, "-y", "-v", "error",
+                    "-f", "lavfi", "-i", f"testsrc2=size={size[0]}x{size[1]}:rate={fps}:duration={seconds}",
+                    "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+                    "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", path],
+                   check=True)
+
+
+def build_cues(surah_number, video, srt_path):
+    generator.json_to_srt(generator.BASE_JSON_PATH.format(surah_number), srt_path)
+    subs = [sub for sub in pysrt.open(srt_path) if sub.start.ordinal / 1000 < video.duration]
+    font_english, font_arabic, font_english_header, font_arabic_header = generator.setup_environment()
+    renderer = get_renderer(generator.TEXT_RENDERER, generator.SHAPING_BACKEND)
+    return (generator.create_header_cues(video, surah_number, font_english_header, font_arabic_header, renderer),
+            generator.create_subtitle_cues(video, subs, font_english, font_arabic, renderer))
+
+
+def run_moviepy(background_path, header_cues, subtitle_cues, output_path, preset):
+    from moviepy import VideoFileClip
+    video = VideoFileClip(background_path)
+    clips = [cue.to_clip() for cue in header_cues + subtitle_cues]
+    final = IndexedCompositeVideoClip([video] + clips, use_bgclip=True).with_duration(video.duration)
+    start = time.perf_counter()
+    final.write_videofile(output_path, fps=video.fps, codec="libx264", audio_codec="aac", preset=preset,
+                          threads=os.cpu_count(), logger=None)
+    elapsed = time.perf_counter() - start
+    video.close()
+    return int(round(video.duration * video.fps)) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the moviepy, numpy and ffmpeg compositing engines end to end.")
+    parser.add_argument("surah_number", type=int, nargs="?", default=112)
+    parser.add_argument("--seconds", type=float, default=20.0, help="Length of the rendered video")
+    parser.add_argument("--size", default="1920x1080")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--workers", type=int, nargs="*", default=[2, 4, 8],
+                        help="Worker counts to run the multi-process compositor with")
+    parser.add_argument("--preset", default="ultrafast", help="x264 preset (fast presets isolate compositing)")
+    parser.add_argument("--variants", nargs="*", choices=sorted(generator.VIDEO_VARIANTS),
+                        default=["720p", "vertical"],
+                        help="Variants to render separately and then together from one decode")
+    args = parser.parse_args()
+    size = tuple(int(v) for v in args.size.split("x"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        background_path = os.path.join(tmp, "background.mp4")
+        make_background(background_path, size, args.fps, args.seconds)
+        video = probe_video(background_path)
+        header_cues, subtitle_cues = build_cues(args.surah_number, video, os.path.join(tmp, "subs.srt"))
+        print(f"Surah {args.surah_number}: {len(header_cues) + len(subtitle_cues)} cues, "
+              f"{args.seconds:.0f}s at {size[0]}x{size[1]} {args.fps} fps")
+
+        moviepy_fps = run_moviepy(background_path, header_cues, subtitle_cues, os.path.join(tmp, "moviepy.mp4"),
+                                  args.preset)
+        print(f"moviepy: {moviepy_fps:7.1f} fps")
+
+        for label, cache_static, pix_fmt in (("numpy, per-cue blending", False, "rgb24"),
+                                             ("numpy, static overlay cache", True, "rgb24"),
+                                             ("numpy, yuv420p planes", False, "yuv420p")):
+            numpy_fps = render_cues(background_path, header_cues + subtitle_cues, os.path.join(tmp, "numpy.mp4"),
+                                    video.size, video.fps, video.duration, audio_path=background_path,
+                                    video_args=encoder_args(preset=args.preset, threads=os.cpu_count()),
+                                    cache_static=cache_static, pix_fmt=pix_fmt)
+            print(f"{label}: {numpy_fps:7.1f} fps ({numpy_fps / moviepy_fps:.1f}x)")
+
+        started = time.perf_counter()
+        composited = render_cues_vfr(background_path, header_cues + subtitle_cues, os.path.join(tmp, "vfr.mp4"),
+                                     video.size, video.fps, video.duration, audio_path=background_path,
+                                     loop_background=False,
+                                     video_args=vfr_video_args(video.fps, preset=args.preset, threads=os.cpu_count()))
+        vfr_fps = int(round(video.duration * video.fps)) / (time.perf_counter() - started)
+        print(f"numpy, VFR ({composited} frames composited): {vfr_fps:7.1f} fps ({vfr_fps / moviepy_fps:.1f}x)")
+
+        for workers in args.workers:
+            parallel_fps = render_cues_parallel(background_path, header_cues + subtitle_cues,
+                                                os.path.join(tmp, "parallel.mp4"), video.size, video.fps,
+                                                video.duration, audio_path=background_path,
+                                                video_args=encoder_args(preset=args.preset, threads=os.cpu_count()),
+                                                workers=workers)
+            print(f"numpy, {workers} workers: {parallel_fps:7.1f} fps ({parallel_fps / moviepy_fps:.1f}x)")
+
+        ffmpeg_fps = render_filtergraph(background_path, background_path, header_cues + subtitle_cues,
+                                        os.path.join(tmp, "ffmpeg.mp4"), video.size, video.fps, video.duration,
+                                        loop_background=False,
+                                        video_args=encoder_args(preset=args.preset, threads=os.cpu_count()),
+                                        sprite_dir=os.path.join(tmp, "sprites"))
+        print(f"ffmpeg filtergraph: {ffmpeg_fps:7.1f} fps ({ffmpeg_fps / moviepy_fps:.1f}x)")
+
+        if args.variants:
+            outputs = []
+            for name in args.variants:
+                variant = generator.VIDEO_VARIANTS[name]
+                variant_video = VideoInfo(variant.size, video.fps, video.duration)
+                variant_cues = build_cues(args.surah_number, variant_video, os.path.join(tmp, "subs.srt"))
+                outputs.append((os.path.join(tmp, f"{name}.mp4"), variant.size, variant_cues[0] + variant_cues[1]))
+            started = time.perf_counter()
+            for output_path, size, cues in outputs:
+                render_cues(background_path, cues, output_path, size, video.fps, video.duration,
+                            audio_path=background_path,
+                            video_args=encoder_args(preset=args.preset, threads=os.cpu_count()))
+            separate = time.perf_counter() - started
+            started = time.perf_counter()
+            render_variants(background_path, outputs, video.fps, video.duration, audio_path=background_path,
+                            loop_background=False,
+                            video_args=encoder_args(preset=args.preset, threads=os.cpu_count()))
+            shared = time.perf_counter() - started
+            print(f"{len(outputs)} variants: {separate:.1f}s as separate renders, {shared:.1f}s from one decode "
+                  f"({separate / shared:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
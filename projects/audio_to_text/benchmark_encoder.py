@@ -0,0 +1,97 @@
+import argparse
+import itertools
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+from moviepy.config import FFMPEG_BINARY
+
+from encoder_profile import profile_path, save_profile
+from ffmpeg_io import DEFAULT_VIDEO_CODEC
+
+# --- CONFIGURATION ---
+PRESETS = ["ultrafast", "veryfast", "faster", "fast", "medium"]
+# Output sizes are only comparable within one tune; "stillimage" also suits still frames, not animated cues
+TUNES = ["none"]
+CRFS = [18, 23]
+
+
+def thread_counts():
+    cpus = os.cpu_count()
+    return sorted({0, 4, 8, 16, 32, cpus} & set(range(cpus + 1)))  # 0 lets x264 pick
+
+
+def bench_args(preset, threads, crf, tune):
+    """x264 arguments of one run exactly as labelled: encoder_args would fill gaps from the saved profile"""
+    args = ["-c:v", DEFAULT_VIDEO_CODEC, "-preset", preset, "-pix_fmt", "yuv420p", "-threads", str(threads),
+            "-crf", str(crf)]
+    return args + ([] if tune == "none" else ["-tune", tune])
+
+
+def run_encode(source, output_path, preset, threads, crf, tune):
+    """Encode the synthetic source once; returns (wall seconds, CPU utilization in [0, 1], output bytes)"""
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    subprocess.run([FFMPEG_BINARY, "-y", "-v", "error", "-f", "lavfi", "-i", source]
+                   + bench_args(preset, threads, crf, tune) + [output_path], check=True)
+    elapsed = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return elapsed, cpu / (elapsed * os.cpu_count()), os.path.getsize(output_path)
+
+
+def pick_settings(results, min_fps, crf, tune="none"):
+    """Smallest output at the target CRF and tune among settings that keep up with min_fps, fastest as tie-break"""
+    candidates = [r for r in results if r["crf"] == crf and r["tune"] == tune]
+    fast_enough = [r for r in candidates if r["fps"] >= min_fps]
+    if not fast_enough:
+        fast_enough = [max(candidates, key=lambda r: r["fps"])]
+    best = min(fast_enough, key=lambda r: (r["bytes"], -r["fps"]))
+    return {"preset": best["preset"], "threads": best["threads"], "crf": best["crf"],
+            "tune": None if best["tune"] == "none" else best["tune"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark x264 settings on this host and save its encoder profile.")
+    parser.add_argument("--size", default="1920x1080")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--seconds", type=float, default=10.0, help="Length of the synthetic clip")
+    parser.add_argument("--presets", nargs="+", default=PRESETS)
+    parser.add_argument("--threads", type=int, nargs="+", default=thread_counts())
+    parser.add_argument("--crfs", type=int, nargs="+", default=CRFS)
+    parser.add_argument("--tunes", nargs="+", default=TUNES, help='x264 tunes, "none" for no tune')
+    parser.add_argument("--crf", type=int, default=23, help="CRF the saved profile must use")
+    parser.add_argument("--tune", default="none", help='x264 tune the saved profile must use, "none" for no tune')
+    parser.add_argument("--min-fps", type=float, default=60.0,
+                        help="Slowest encode speed a profile may have (2x realtime at 30 fps by default)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the results without saving a profile")
+    args = parser.parse_args()
+    if args.crf not in args.crfs:
+        args.crfs.append(args.crf)
+    if args.tune not in args.tunes:
+        args.tunes.append(args.tune)
+
+    # testsrc2 moves and has gradients and text, a stand-in for the background with subtitles
+    source = f"testsrc2=size={args.size}:rate={args.fps}:duration={args.seconds}"
+    frames = int(round(args.seconds * args.fps))
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "encode.mp4")
+        for preset, threads, crf, tune in itertools.product(args.presets, args.threads, args.crfs, args.tunes):
+            elapsed, cpu, size = run_encode(source, output_path, preset, threads, crf, tune)
+            results.append({"preset": preset, "threads": threads, "crf": crf, "tune": tune,
+                            "fps": frames / elapsed, "cpu": cpu, "bytes": size})
+            print(f"{preset:>9} threads={threads:<3} crf={crf:<3} tune={tune:<10} "
+                  f"{frames / elapsed:7.1f} fps  cpu {cpu * 100:5.1f}%  {size / 1e6:7.2f} MB")
+
+    settings = pick_settings(results, args.min_fps, args.crf, args.tune)
+    print(f"Best settings: {settings}")
+    if not args.dry_run:
+        save_profile(settings, results)
+        print(f"Saved encoder profile to {profile_path()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import tempfile
+import time
+
+from background_cache import open_background
+from benchmark_compositor import make_background
+from ffmpeg_io import IO_BACKENDS, encoder_args, open_writer
+from frame_compositor import PIXEL_FORMATS
+
+
+def time_decode(background_path, size, fps, frame_count, pix_fmt, backend):
+    """Milliseconds per frame to read the looped background into a reused buffer"""
+    reader = open_background(background_path, size, fps, loop=True, pix_fmt=pix_fmt, backend=backend)
+    started = time.perf_counter()
+    for _ in range(frame_count):
+        reader.read()
+    elapsed = time.perf_counter() - started
+    reader.close()
+    return elapsed * 1000 / frame_count
+
+
+def time_encode(background_path, output_path, size, fps, frame_count, pix_fmt, backend, preset):
+    """Milliseconds per frame to hand a decoded frame to the encoder, muxing the background's audio"""
+    reader = open_background(background_path, size, fps, loop=True, pix_fmt=pix_fmt, backend=backend)
+    frame = reader.read()
+    writer = open_writer(output_path, size, fps, backend=backend, audio_path=background_path, pix_fmt=pix_fmt,
+                         video_args=encoder_args(preset=preset, threads=os.cpu_count()))
+    started = time.perf_counter()
+    for _ in range(frame_count):
+        writer.write(frame)
+    writer.close()
+    elapsed = time.perf_counter() - started
+    reader.close()
+    return elapsed * 1000 / frame_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the ffmpeg pipe and in-process PyAV frame I/O backends.")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Length of the synthetic background")
+    parser.add_argument("--size", default="1920x1080")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--backends", nargs="+", choices=IO_BACKENDS, default=list(IO_BACKENDS))
+    parser.add_argument("--preset", default="ultrafast", help="x264 preset (fast presets isolate the I/O cost)")
+    args = parser.parse_args()
+    size = tuple(int(v) for v in args.size.split("x"))
+    frame_count = int(round(args.seconds * args.fps))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        background_path = os.path.join(tmp, "background.mp4")
+        make_background(background_path, size, args.fps, args.seconds)
+        print(f"{frame_count} frames at {size[0]}x{size[1]} {args.fps} fps")
+        for pix_fmt in PIXEL_FORMATS:
+            for backend in args.backends:
+                decode_ms = time_decode(background_path, size, args.fps, frame_count, pix_fmt, backend)
+                encode_ms = time_encode(background_path, os.path.join(tmp, f"{backend}.mp4"), size, args.fps,
+                                        frame_count, pix_fmt, backend, args.preset)
+                print(f"{backend:>6} {pix_fmt:<8} decode {decode_ms:6.2f} ms/frame  encode {encode_ms:6.2f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from text_renderer import TEXT_RENDERERS, get_renderer
+
+# --- CONFIGURATION ---
+BASE_JSON_PATH = "quran/{}.json"
+FONT_ARABIC_PATH = "fonts/NotoSansArabic-Regular.ttf"
+FONT_SIZE_ARABIC = 50
+VIDEO_SIZE = (1920, 1080)
+MAX_WIDTH = VIDEO_SIZE[0] - 160
+
+
+def load_verses(surah_number):
+    with open(BASE_JSON_PATH.format(surah_number), 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return [v["arabic_text"] for v in data["surah_verses"]]
+
+
+def run_renderer(renderer, verses, frames_per_cue):
+    """Time sprite rendering and per-frame blending of each sprite onto a full frame"""
+    frame = np.zeros((VIDEO_SIZE[1], VIDEO_SIZE[0], 3), dtype=np.uint8)
+
+    start = time.perf_counter()
+    sprites = [renderer.render(verse, FONT_ARABIC_PATH, FONT_SIZE_ARABIC, is_rtl=True, max_width=MAX_WIDTH,
+                               h_pad=60, is_draw_bg=True) for verse in verses]
+    render_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for sprite in sprites:
+        x = (VIDEO_SIZE[0] - sprite.width) // 2
+        y = max(VIDEO_SIZE[1] - sprite.height - 40, 0)
+        for _ in range(frames_per_cue):
+            sprite.blend_onto(frame, x, y)
+    blend_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for sprite in sprites:
+        sprite.to_rgba()
+    convert_seconds = time.perf_counter() - start
+
+    return render_seconds, blend_seconds, convert_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the PIL and Pango/Cairo text renderers on real verses.")
+    parser.add_argument("surah_number", type=int, nargs="?", default=2)
+    parser.add_argument("--frames", type=int, default=30, help="Blends per cue (frames the cue is on screen)")
+    args = parser.parse_args()
+
+    verses = load_verses(args.surah_number)
+    print(f"Surah {args.surah_number}: {len(verses)} verses, {args.frames} blended frames per cue")
+
+    for name in TEXT_RENDERERS:
+        try:
+            renderer = get_renderer(name)
+        except (ImportError, OSError) as e:
+            print(f"{name:>6}: skipped ({str(e).splitlines()[0]})")
+            continue
+
+        render_seconds, blend_seconds, convert_seconds = run_renderer(renderer, verses, args.frames)
+        blended = len(verses) * args.frames
+        print(f"{name:>6}: render {render_seconds:6.2f}s ({len(verses) / render_seconds:7.1f} cues/s)  "
+              f"blend {blend_seconds:6.2f}s ({blended / blend_seconds:7.1f} frames/s)  "
+              f"to_rgba {convert_seconds:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import glob
+import json
+import time
+
+from PIL import Image, ImageDraw, features
+
+from text_layout import SHAPING_BACKENDS, layout_text, load_font
+
+# --- CONFIGURATION ---
+CORPUS_GLOB = "quran/[0-9]*.json"
+FONT_ARABIC_PATH = "fonts/NotoSansArabic-Regular.ttf"
+FONT_SIZE_ARABIC = 50
+MAX_WIDTH = 1920 - 160
+
+
+def load_corpus(pattern=CORPUS_GLOB):
+    """Collect every verse's arabic_text from the surah JSON files"""
+    verses = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        verses.extend(v["arabic_text"] for v in data["surah_verses"])
+    return verses
+
+
+def run_backend(backend, verses, rasterize=True):
+    """Shape (and optionally rasterize) all verses, returning (shape_seconds, raster_seconds)"""
+    font = load_font(FONT_ARABIC_PATH, FONT_SIZE_ARABIC, backend)
+
+    start = time.perf_counter()
+    layouts = [layout_text(verse, font, is_rtl=True, max_width=MAX_WIDTH) for verse in verses]
+    shape_seconds = time.perf_counter() - start
+
+    raster_seconds = 0.0
+    if rasterize:
+        start = time.perf_counter()
+        for layout in layouts:
+            height = layout.line_pitch * len(layout.lines)
+            img = Image.new("RGBA", (int(layout.width) + 40, int(height) + 40), (0, 0, 0, 0))
+            draw = ImageDraw.Draw(img)
+            for line_idx, line in enumerate(layout.lines):
+                draw.text((10, 10 + line_idx * layout.line_pitch), line.display_text, font=font, fill="white",
+                          **layout.draw_kwargs)
+        raster_seconds = time.perf_counter() - start
+
+    return shape_seconds, raster_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Arabic shaping backends over the whole corpus.")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N verses")
+    parser.add_argument("--no-raster", action="store_true", help="Measure shaping only")
+    args = parser.parse_args()
+
+    verses = load_corpus()[:args.limit]
+    total_chars = sum(len(v) for v in verses)
+    print(f"Corpus: {len(verses)} verses, {total_chars} characters")
+
+    for backend in SHAPING_BACKENDS:
+        if backend == "raqm" and not features.check_feature("raqm"):
+            print(f"{backend:>9}: skipped (Pillow built without libraqm)")
+            continue
+
+        shape_seconds, raster_seconds = run_backend(backend, verses, rasterize=not args.no_raster)
+        total = shape_seconds + raster_seconds
+        print(f"{backend:>9}: shape {shape_seconds:7.2f}s  raster {raster_seconds:7.2f}s  "
+              f"total {total:7.2f}s  ({len(verses) / total:8.1f} verses/s, {total_chars / total:10.0f} chars/s)")
+
+
+if __name__ == "__main__":
+    main()
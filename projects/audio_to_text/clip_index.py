@@ -0,0 +1,68 @@
+import math
+
+from moviepy import CompositeVideoClip
+
+# --- CONFIGURATION ---
+BUCKET_SECONDS = 1.0
+
+
+class IntervalIndex:
+    """Time-bucketed index of items active over [start, end)
+
+    Every item is registered in each bucket its interval overlaps, so a
+    lookup only checks the few items of one bucket no matter how many cues
+    the timeline has. Items come back in their original order (layer order).
+    """
+
+    def __init__(self, items, bucket_seconds=BUCKET_SECONDS, bounds=None):
+        self.items = list(items)
+        self.bucket_seconds = bucket_seconds
+        bounds = bounds or (lambda item: (item.start, item.end))
+
+        self.intervals = []
+        for item in self.items:
+            start, end = bounds(item)
+            self.intervals.append((start or 0.0, math.inf if end is None else end))
+
+        finite_ends = [end for _, end in self.intervals if end != math.inf]
+        last = max([start for start, _ in self.intervals] + finite_ends + [0.0])
+        self.buckets = [[] for _ in range(int(last // bucket_seconds) + 1)]
+        for position, (start, end) in enumerate(self.intervals):
+            # Items may start before 0 (header_bake shifts settled cues back by the intro length):
+            # a negative bucket index would slice from the end of the list, so clamp to the first bucket
+            if end <= 0:
+                continue
+            first_bucket = max(int(start // bucket_seconds), 0)
+            last_bucket = len(self.buckets) - 1 if end == math.inf else int(end // bucket_seconds)
+            for bucket in self.buckets[first_bucket:last_bucket + 1]:
+                bucket.append(position)
+
+    def active(self, t):
+        """Items whose interval contains t"""
+        bucket_idx = int(t // self.bucket_seconds)
+        if bucket_idx < 0:
+            return []
+        bucket_idx = min(bucket_idx, len(self.buckets) - 1)
+        intervals = self.intervals
+        return [self.items[p] for p in self.buckets[bucket_idx] if intervals[p][0] <= t < intervals[p][1]]
+
+
+class IndexedCompositeVideoClip(CompositeVideoClip):
+    """CompositeVideoClip that only visits the clips active at t
+
+    moviepy checks ``is_playing(t)`` on every clip for every frame; with
+    hundreds of subtitle clips (thousands for per-letter clips) that check
+    alone grows with the number of cues. Here clips are looked up in an
+    IntervalIndex built once from their start/end times.
+    """
+
+    def __init__(self, clips, *args, bucket_seconds=BUCKET_SECONDS, **kwargs):
+        super().__init__(clips, *args, **kwargs)
+        self.clip_index = IntervalIndex(self.clips, bucket_seconds)
+
+        # Without use_bgclip moviepy also composites one mask per clip; index that composite too
+        if isinstance(self.mask, CompositeVideoClip):
+            self.mask.playing_clips = IntervalIndex(self.mask.clips, bucket_seconds).active
+
+    def playing_clips(self, t=0):
+        return self.clip_index.active(t)
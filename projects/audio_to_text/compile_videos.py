@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+
+from moviepy.config import FFMPEG_BINARY
+
+from ayah_clips import BASE_JSON_PATH, BASE_VIDEO_PATH, frame_time, verse_timings
+from ffmpeg_io import probe_duration, probe_keyframes, probe_streams, probe_video
+
+# --- CONFIGURATION ---
+CHAPTERS_PATH = "quran/chapters.json"
+QURAN_OUTPUT_PATH = "data/quran-video.mp4"
+BASE_JUZ_OUTPUT_PATH = "data/juz-{}-video.mp4"
+# (surah, verse) each juz' starts at
+JUZ_STARTS = [(1, 1), (2, 142), (2, 253), (3, 93), (4, 24), (4, 148), (5, 82), (6, 111), (7, 88), (8, 41),
+              (9, 93), (11, 6), (12, 53), (15, 1), (17, 1), (18, 75), (21, 1), (23, 1), (25, 21), (27, 56),
+              (29, 46), (33, 31), (36, 28), (39, 32), (41, 47), (46, 1), (51, 31), (58, 1), (67, 1), (78, 1)]
+
+
+def juz_parts(juz, chapters):
+    """(surah, first verse, last verse) of every surah or part of a surah in a juz'"""
+    start_surah, start_verse = JUZ_STARTS[juz - 1]
+    end_surah, end_verse = JUZ_STARTS[juz] if juz < len(JUZ_STARTS) else (115, 1)
+    parts = []
+    for surah_number in range(start_surah, min(end_surah, 114) + 1):
+        first = start_verse if surah_number == start_surah else 1
+        last = end_verse - 1 if surah_number == end_surah else chapters["en"][str(surah_number)]["versesCount"]
+        if first <= last:
+            parts.append((surah_number, first, last))
+    return parts
+
+
+class Part:
+    """One rendered surah video, or the verse range [first, last] of it, cut on its verse keyframes"""
+
+    def __init__(self, surah_number, first=None, last=None):
+        self.surah_number = surah_number
+        self.path = os.path.abspath(BASE_VIDEO_PATH.format(surah_number))
+        self.video = probe_video(self.path)
+        self.streams = probe_streams(self.path)
+        timings = verse_timings(BASE_JSON_PATH.format(surah_number))
+        self.timings = [timing for timing in timings
+                        if (first or 1) <= int(timing["verse_key"].split(":")[1]) <= (last or len(timings))]
+        self.whole = len(self.timings) == len(timings)
+        if self.whole:
+            self.inpoint, self.outpoint = 0.0, probe_duration(self.path)
+        else:
+            self.inpoint = frame_time(self.timings[0]["timestamp_from"], self.video.fps)
+            self.outpoint = frame_time(self.timings[-1]["timestamp_to"], self.video.fps)
+
+    @property
+    def duration(self):
+        return self.outpoint - self.inpoint
+
+    def stream_format(self):
+        """Codec parameters -c copy needs to match across inputs, one tuple per stream"""
+        return tuple((stream.get("codec_type"), stream.get("codec_name"), stream.get("profile"),
+                      stream.get("pix_fmt"), stream.get("width"), stream.get("height"), stream.get("r_frame_rate"),
+                      stream.get("time_base"), stream.get("sample_rate"), stream.get("channels"))
+                     for stream in self.streams)
+
+    def starts_on_keyframe(self):
+        """True when the inpoint is on a keyframe (within half a frame), so the stream copy decodes from it"""
+        if self.whole:
+            return True
+        tolerance = 0.5 / self.video.fps
+        return any(abs(t - self.inpoint) <= tolerance for t in probe_keyframes(self.path))
+
+    def concat_lines(self):
+        lines = [f"file '{self.path}'\n"]
+        if not self.whole:
+            # Just past the keyframe, so rounding never makes the demuxer start from the previous one
+            lines += [f"inpoint {self.inpoint + 0.0005:.6f}\n", f"outpoint {self.outpoint:.6f}\n"]
+        return lines
+
+
+def _escape(value):
+    """Escape an ffmetadata value"""
+    for char in "\\=;#\n":
+        value = value.replace(char, "\\" + char)
+    return value
+
+
+def write_chapters(path, parts, chapters, verse_chapters=False):
+    """ffmetadata with one chapter per surah (or per verse), in milliseconds of the compiled timeline"""
+    lines = [";FFMETADATA1\n"]
+    offset = 0.0
+    for part in parts:
+        name = f'Surah {chapters["en"][str(part.surah_number)]["transliteratedName"]}'
+        if verse_chapters:
+            marks = [(offset + frame_time(timing["timestamp_from"], part.video.fps) - part.inpoint,
+                      f'{name} {timing["verse_key"]}') for timing in part.timings]
+            marks[0] = (offset, marks[0][1])
+        else:
+            marks = [(offset, name)]
+        ends = [start for start, _ in marks[1:]] + [offset + part.duration]
+        for (start, title), end in zip(marks, ends):
+            lines += ["[CHAPTER]\n", "TIMEBASE=1/1000\n", f"START={round(start * 1000)}\n",
+                      f"END={round(end * 1000)}\n", f"title={_escape(title)}\n"]
+        offset += part.duration
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+
+def compile_videos(parts, output_path, chapters, verse_chapters=False):
+    """Join rendered surah videos with the concat demuxer and -c copy, adding chapter markers
+
+    Every input must come from the same encode settings (codec, profile,
+    pixel format, size, frame rate, audio format); partial surahs must start
+    on a keyframe, which VERSE_KEYFRAMES puts on every verse.
+    """
+    formats = {}
+    for part in parts:
+        formats.setdefault(part.stream_format(), []).append(os.path.basename(part.path))
+    if len(formats) > 1:
+        details = "; ".join(f"{', '.join(names)}: {stream_format}" for stream_format, names in formats.items())
+        raise ValueError(f"Videos differ in codec parameters and cannot be joined without re-encoding: {details}")
+    for part in parts:
+        if not part.starts_on_keyframe():
+            raise ValueError(f"{part.path} has no keyframe at {part.inpoint:.3f}s (verse "
+                             f"{part.timings[0]['verse_key']}), render it with --verse-keyframes")
+    with tempfile.TemporaryDirectory() as tmp:
+        concat_path = os.path.join(tmp, "parts.ffconcat")
+        with open(concat_path, "w", encoding="utf-8") as f:
+            f.write("ffconcat version 1.0\n")
+            for part in parts:
+                f.writelines(part.concat_lines())
+        metadata_path = os.path.join(tmp, "chapters.txt")
+        write_chapters(metadata_path, parts, chapters, verse_chapters)
+        subprocess.run([FFMPEG_BINARY, "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", concat_path,
+                        "-i", metadata_path, "-map", "0", "-map_metadata", "1", "-map_chapters", "1", "-c", "copy",
+                        "-movflags", "+faststart", output_path], check=True)
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Join rendered surah videos into one chaptered video without "
+                                                 "re-encoding.")
+    parser.add_argument("surahs", type=int, nargs="*", help="Surah numbers (default: all 114)")
+    parser.add_argument("--juz", type=int, choices=range(1, len(JUZ_STARTS) + 1),
+                        help="Compile one juz' instead, cutting surahs that cross its boundaries at verse keyframes")
+    parser.add_argument("--verse-chapters", action="store_true", help="One chapter per verse instead of per surah")
+    parser.add_argument("--output", help="Output path (default: data/quran-video.mp4 or data/juz-{n}-video.mp4)")
+    args = parser.parse_args()
+
+    with open(CHAPTERS_PATH, "r", encoding="utf-8") as f:
+        chapters = json.load(f)
+    if args.juz:
+        parts = [Part(surah_number, first, last) for surah_number, first, last in juz_parts(args.juz, chapters)]
+        output_path = args.output or BASE_JUZ_OUTPUT_PATH.format(args.juz)
+    else:
+        parts = [Part(surah_number) for surah_number in args.surahs or range(1, 115)]
+        output_path = args.output or QURAN_OUTPUT_PATH
+
+    compile_videos(parts, output_path, chapters, args.verse_chapters)
+    hours, seconds = divmod(sum(part.duration for part in parts), 3600)
+    print(f"Compiled {len(parts)} videos into {output_path} ({int(hours)}h{seconds / 60:04.1f}m)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import functools
+import json
+import os
+import socket
+
+# --- CONFIGURATION ---
+PROFILE_DIR = "data/encoder_profiles"
+DEFAULT_SETTINGS = {"preset": "medium", "threads": 32, "crf": None, "tune": None}
+
+
+def profile_path(host=None):
+    """Per-host encoder profile written by benchmark_encoder.py"""
+    return os.path.join(PROFILE_DIR, f"{host or socket.gethostname()}.json")
+
+
+@functools.lru_cache(maxsize=None)
+def load_profile(path=None):
+    """Encoder settings of this host's profile, or {} when the host was never benchmarked"""
+    path = path or profile_path()
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("settings", {})
+
+
+def save_profile(settings, results, path=None):
+    path = path or profile_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"host": socket.gethostname(), "cpu_count": os.cpu_count(), "settings": settings,
+                   "results": results}, f, indent=2)
+    load_profile.cache_clear()
+
+
+def tuned_settings(defaults=None, **overrides):
+    """preset / threads / crf / tune: explicit values, then the host profile, ``defaults``, DEFAULT_SETTINGS"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(defaults or {})
+    settings.update(load_profile())
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    return settings
+
+
+def moviepy_write_kwargs(defaults=None, **overrides):
+    """Tuned settings as write_videofile() keyword arguments"""
+    settings = tuned_settings(defaults, **overrides)
+    ffmpeg_params = []
+    if settings["crf"] is not None:
+        ffmpeg_params += ["-crf", str(settings["crf"])]
+    if settings["tune"]:
+        ffmpeg_params += ["-tune", settings["tune"]]
+    return dict(preset=settings["preset"], threads=settings["threads"], ffmpeg_params=ffmpeg_params or None)
@@ -0,0 +1,168 @@
+import os
+import shutil
+import subprocess
+import time
+
+import numpy as np
+from PIL import Image
+from moviepy.config import FFMPEG_BINARY
+
+from ffmpeg_io import audio_args, encoder_args
+
+# --- CONFIGURATION ---
+SPRITE_DIR = "data/temp_sprites"
+FILTER_SCRIPT_NAME = "overlay.filtergraph"
+
+
+def assign_tracks(cues):
+    """Split cues into tracks of non-overlapping intervals (greedy interval partitioning, layer order kept)
+
+    Every track becomes one ffmpeg input, so the input count is the
+    maximum number of cues on screen at once rather than the number of cues.
+    """
+    tracks = []
+    for cue in cues:
+        for track in tracks:
+            if all(other.end <= cue.start or other.start >= cue.end for other in track):
+                track.append(cue)
+                break
+        else:
+            tracks.append([cue])
+    return tracks
+
+
+class Track:
+    """One track's sprites as a concat-demuxer slideshow of padded canvases
+
+    Every sprite is placed on a transparent canvas of 2 * max_width so a
+    fixed-size crop window can slide across it for the wipe reveal (crop
+    can't animate its width): ltr sprites sit at column max_width, rtl
+    sprites end at it. The crop and overlay expressions are switched per cue
+    by a sendcmd script, so each frame evaluates only the current cue's
+    expression, and the overlay is disabled between cues.
+    """
+
+    def __init__(self, cues, index, sprite_dir, duration):
+        self.cues = sorted(cues, key=lambda cue: cue.start)
+        self.max_width = max(cue.width for cue in self.cues)
+        self.height = max(cue.height for cue in self.cues)
+        self.name = f"track{index:02d}"
+        self.concat_path = os.path.join(sprite_dir, f"track_{index:02d}.ffconcat")
+        self.commands_path = os.path.join(sprite_dir, f"track_{index:02d}.cmd")
+
+        gap_path = os.path.join(sprite_dir, f"track_{index:02d}_gap.png")
+        Image.new("RGBA", (2 * self.max_width, self.height)).save(gap_path)
+        entries, clock = [], 0.0
+        for idx, cue in enumerate(self.cues):
+            if cue.start > clock:
+                entries.append((gap_path, cue.start - clock))
+            path = os.path.join(sprite_dir, f"track_{index:02d}_cue_{idx:05d}.png")
+            canvas = np.zeros((self.height, 2 * self.max_width, 4), dtype=np.uint8)
+            offset = self.canvas_offset(cue)
+            canvas[:cue.height, offset:offset + cue.width] = cue.sprite.to_rgba()
+            Image.fromarray(canvas).save(path, compress_level=1)
+            entries.append((path, cue.duration))
+            clock = max(clock, cue.start) + cue.duration
+        entries.append((gap_path, max(duration - clock, 1.0)))
+
+        with open(self.concat_path, "w", encoding="utf-8") as f:
+            f.write("ffconcat version 1.0\n")
+            for path, entry_duration in entries:
+                f.write(f"file '{os.path.abspath(path)}'\nduration {entry_duration:.3f}\n")
+            # The concat demuxer drops the last entry's duration unless the file is listed again
+            f.write(f"file '{os.path.abspath(gap_path)}'\n")
+        with open(self.commands_path, "w", encoding="utf-8") as f:
+            f.write(self.commands())
+
+    def canvas_offset(self, cue):
+        return self.max_width - cue.width if cue.animation.wipe == "rtl" else self.max_width
+
+    @staticmethod
+    def _visible(cue):
+        """Revealed width of the cue as an expression of t"""
+        anim = cue.animation
+        if anim.wipe is None or anim.duration <= 0:
+            return str(cue.width)
+        return f"{cue.width}*clip((t-{cue.start:.3f})/{anim.duration:.3f},0,1)"
+
+    def commands(self):
+        """sendcmd script: on entering each cue's [start, end) set its crop and overlay expressions"""
+        m = self.max_width
+        lines = []
+        for cue in self.cues:
+            visible = self._visible(cue)
+            x = int(round(cue.x))
+            if cue.animation.wipe == "rtl":
+                crop_x, overlay_x = f"{m}-{visible}", f"{x + cue.width}-{visible}"
+            else:
+                crop_x, overlay_x = visible, f"{x - m}+{visible}"
+            # Intervals run in start order, so a cue's leave comes before the next cue's enter on a shared frame
+            lines.append(f"{cue.start:.3f}-{cue.end:.3f} "
+                         f"[enter] crop@{self.name} x '{crop_x}', "
+                         f"[enter] overlay@{self.name} x '{overlay_x}', "
+                         f"[enter] overlay@{self.name} y {int(round(cue.y))}, "
+                         f"[enter] overlay@{self.name} enable 1, "
+                         f"[leave] overlay@{self.name} enable 0;")
+        return "\n".join(lines) + "\n"
+
+    def filters(self, input_label, main_label, out_label, fps):
+        """Track preparation (CFR, per-cue commands, sliding crop) and the overlay onto the main chain"""
+        sprite_label = f"{out_label}s"
+        commands_path = self.commands_path.replace("\\", "/")
+        # sendcmd sits on the track's own chain, so a cue's commands reach crop and overlay with its first frame
+        return [f"[{input_label}]format=rgba,fps={fps},sendcmd=f='{commands_path}',"
+                f"crop@{self.name}=w={self.max_width}:h=ih:x=0:y=0[{sprite_label}]",
+                f"[{main_label}][{sprite_label}]overlay@{self.name}=x=0:y=0:enable=0:eof_action=pass[{out_label}]"]
+
+
+def build_filter_script(tracks, size, fps, first_track_input=2):
+    """Whole filtergraph: scaled background, one overlay per track, yuv420p output as [vout]"""
+    lines = [f"[0:v]scale={size[0]}:{size[1]},fps={fps}[bg0]"]
+    main_label = "bg0"
+    for idx, track in enumerate(tracks):
+        out_label = f"bg{idx + 1}"
+        lines += track.filters(f"{first_track_input + idx}:v", main_label, out_label, fps)
+        main_label = out_label
+    lines.append(f"[{main_label}]format=yuv420p[vout]")
+    return ";\n".join(lines) + "\n"
+
+
+def render_filtergraph(background_path, audio_path, cues, output_path, size, fps, duration, loop_background=True,
+                       video_args=None, audio_output_args=None, sprite_dir=SPRITE_DIR):
+    """Composite and encode in one native ffmpeg process: Python only rasterizes the sprites
+
+    Each sprite is decoded once; wipes come from per-cue crop/overlay expressions set by sendcmd.
+    Cues with a frame_source (word highlighting) are drawn with their normal
+    colours, and fades shorter than a frame are dropped as they are invisible.
+    Returns the measured frames per second.
+    """
+    cues = [cue for cue in cues if cue.duration > 0 and cue.start < duration]
+    if any(cue.frame_source is not None for cue in cues):
+        print("Filtergraph engine draws word-highlight cues without the highlight")
+    if any(max(cue.animation.fade_in, cue.animation.fade_out) >= 1.0 / fps for cue in cues):
+        print("Filtergraph engine does not animate fades")
+
+    os.makedirs(sprite_dir, exist_ok=True)
+    try:
+        tracks = [Track(track_cues, idx, sprite_dir, duration) for idx, track_cues in enumerate(assign_tracks(cues))]
+        script_path = os.path.join(sprite_dir, FILTER_SCRIPT_NAME)
+        with open(script_path, "w", encoding="utf-8") as f:
+            f.write(build_filter_script(tracks, size, fps))
+
+        command = [FFMPEG_BINARY, "-y", "-v", "error", "-stats"]
+        command += (["-stream_loop", "-1"] if loop_background else []) + ["-i", background_path]
+        command += ["-i", audio_path]
+        for track in tracks:
+            command += ["-f", "concat", "-safe", "0", "-i", track.concat_path]
+        command += ["-filter_complex_script", script_path, "-map", "[vout]", "-map", "1:a:0",
+                    "-t", f"{duration:.3f}"]
+        command += (video_args or encoder_args()) + (audio_output_args or audio_args()) + [output_path]
+
+        started = time.perf_counter()
+        subprocess.run(command, check=True)
+    finally:
+        shutil.rmtree(sprite_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - started
+    measured_fps = int(round(duration * fps)) / elapsed if elapsed else 0.0
+    print(f"ffmpeg composited {len(cues)} cues on {len(tracks)} tracks in {elapsed:.1f}s ({measured_fps:.1f} fps)")
+    return measured_fps
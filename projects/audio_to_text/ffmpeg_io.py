@@ -0,0 +1,306 @@
+import json
+import os
+import queue
+import subprocess
+import threading
+
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+
+from encoder_profile import tuned_settings
+
+# --- CONFIGURATION ---
+# ffprobe next to moviepy's ffmpeg (same file name), else the one on PATH: imageio-ffmpeg ships no ffprobe
+FFMPEG_DIR, FFMPEG_NAME = os.path.split(FFMPEG_BINARY)
+FFPROBE_BINARY = os.path.join(FFMPEG_DIR, FFMPEG_NAME.replace("ffmpeg", "ffprobe"))
+if "ffmpeg" not in FFMPEG_NAME or not os.path.isfile(FFPROBE_BINARY):
+    FFPROBE_BINARY = "ffprobe"
+DEFAULT_VIDEO_CODEC = "libx264"
+DEFAULT_AUDIO_CODEC = "aac"
+DEFAULT_AUDIO_BITRATE = "192k"
+IO_BACKENDS = ("ffmpeg", "pyav")  # ffmpeg subprocesses behind pipes, or libav in process through PyAV
+SPLIT_QUEUE_FRAMES = 8  # Frames SplitBackgroundReader buffers per output, so one output may run ahead of another
+
+
+def probe_duration(path):
+    """Duration of a media file in seconds, via ffprobe (falls back to parsing ffmpeg's banner)"""
+    try:
+        output = subprocess.run([FFPROBE_BINARY, "-v", "error", "-show_entries", "format=duration", "-of", "json",
+                                 path], capture_output=True, check=True, text=True).stdout
+        return float(json.loads(output)["format"]["duration"])
+    except (OSError, subprocess.CalledProcessError, KeyError, ValueError):
+        from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+        return ffmpeg_parse_infos(path)["duration"]
+
+
+def _open_for_probe(path):
+    """PyAV container for the probes when ffprobe is missing (moviepy's imageio-ffmpeg ships none)"""
+    try:
+        # Optional dependency, only needed when there is no ffprobe
+        import av
+    except ImportError:
+        raise RuntimeError(f"Probing {path} needs a system ffprobe on PATH (or PyAV)") from None
+    return av.open(path)
+
+
+def probe_streams(path):
+    """Codec parameters of every stream of a media file, via ffprobe or PyAV (one dict per stream)"""
+    try:
+        output = subprocess.run([FFPROBE_BINARY, "-v", "error", "-show_entries",
+                                 "stream=codec_type,codec_name,profile,pix_fmt,width,height,r_frame_rate,time_base,"
+                                 "sample_rate,channels", "-of", "json", path], capture_output=True, check=True,
+                                text=True).stdout
+        return json.loads(output)["streams"]
+    except OSError:
+        pass
+    with _open_for_probe(path) as container:
+        streams = []
+        for stream in container.streams:
+            codec = stream.codec_context
+            info = {"codec_type": stream.type, "codec_name": codec.name, "profile": stream.profile,
+                    "time_base": str(stream.time_base)}
+            if stream.type == "video":
+                rate = stream.base_rate or stream.average_rate
+                info.update(pix_fmt=codec.pix_fmt, width=codec.width, height=codec.height,
+                            r_frame_rate=f"{rate.numerator}/{rate.denominator}" if rate else None)
+            elif stream.type == "audio":
+                info.update(sample_rate=str(codec.sample_rate), channels=codec.channels)
+            streams.append(info)
+        return streams
+
+
+def probe_keyframes(path):
+    """Presentation times of the first video stream's keyframes, from packet flags (no decoding)"""
+    try:
+        output = subprocess.run([FFPROBE_BINARY, "-v", "error", "-select_streams", "v:0", "-show_entries",
+                                 "packet=pts_time,flags", "-of", "json", path], capture_output=True, check=True,
+                                text=True).stdout
+        return sorted(float(packet["pts_time"]) for packet in json.loads(output)["packets"]
+                      if "K" in packet.get("flags", "") and packet.get("pts_time", "N/A") != "N/A")
+    except OSError:
+        pass
+    with _open_for_probe(path) as container:
+        stream = container.streams.video[0]
+        return sorted(float(packet.pts * stream.time_base) for packet in container.demux(stream)
+                      if packet.is_keyframe and packet.pts is not None)
+
+
+def frame_shape(size, pix_fmt="rgb24", channels=3):
+    """Array shape of one raw frame: (h, w, channels), or flat planar Y, U, V for yuv420p"""
+    if pix_fmt == "yuv420p":
+        return (size[0] * size[1] + 2 * ((size[0] + 1) // 2) * ((size[1] + 1) // 2),)
+    return size[1], size[0], channels
+
+
+class VideoInfo:
+    """Size, fps and duration of a video file (what the cue builders read off a VideoFileClip)"""
+
+    def __init__(self, size, fps, duration):
+        self.size = tuple(size)
+        self.w, self.h = self.size
+        self.fps = fps
+        self.duration = duration
+
+
+def probe_video(path):
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+    infos = ffmpeg_parse_infos(path)
+    return VideoInfo(infos["video_size"], infos["video_fps"], infos["duration"])
+
+
+def keyframe_args(times):
+    """-force_key_frames at the given output times in seconds (none when times is empty)"""
+    if not times:
+        return []
+    return ["-force_key_frames", ",".join(f"{t:.6f}" for t in times)]
+
+
+def encoder_args(preset=None, threads=None, crf=None, tune=None, codec=DEFAULT_VIDEO_CODEC, keyframes=None):
+    """x264 output arguments shared by every render path
+
+    Settings left as None come from this host's encoder profile (see
+    benchmark_encoder.py), falling back to encoder_profile.DEFAULT_SETTINGS.
+    ``keyframes`` forces keyframes at those times (see ayah_clips.keyframe_times).
+    """
+    settings = tuned_settings(preset=preset, threads=threads, crf=crf, tune=tune)
+    args = ["-c:v", codec, "-preset", settings["preset"], "-pix_fmt", "yuv420p"]
+    if settings["threads"]:
+        args += ["-threads", str(settings["threads"])]
+    if settings["crf"] is not None:
+        args += ["-crf", str(settings["crf"])]
+    if settings["tune"]:
+        args += ["-tune", settings["tune"]]
+    return args + keyframe_args(keyframes)
+
+
+def audio_args(audio_codec=DEFAULT_AUDIO_CODEC, audio_bitrate=DEFAULT_AUDIO_BITRATE):
+    if audio_codec == "copy":
+        return ["-c:a", "copy"]
+    return ["-c:a", audio_codec, "-b:a", audio_bitrate]
+
+
+class BackgroundReader:
+    """Decodes the background video through an ffmpeg pipe into one reusable frame buffer
+
+    ``loop`` repeats the input indefinitely (-stream_loop -1); ``start`` seeks
+    (in seconds) before reading. With pix_fmt="yuv420p" the buffer is flat.
+    ``intro_path`` replaces the first ``intro_seconds`` of the background.
+    """
+
+    def __init__(self, path, size, fps, loop=False, start=0.0, pix_fmt="rgb24", channels=3, intro_path=None,
+                 intro_seconds=0.0):
+        self.size = size
+        self.fps = fps
+        scale = f"scale={size[0]}:{size[1]},fps={fps}"
+        command = [FFMPEG_BINARY, "-v", "error"]
+        if intro_path:
+            # The first intro_seconds come from intro_path, then path continues at the same timestamp
+            command += ["-i", intro_path]
+        if loop:
+            command += ["-stream_loop", "-1"]
+        if start:
+            command += ["-ss", f"{start:.3f}"]
+        command += ["-i", path, "-an"]
+        if intro_path:
+            command += ["-filter_complex",
+                        f"[0:v]{scale},trim=end={intro_seconds:.3f},setpts=PTS-STARTPTS[intro];"
+                        f"[1:v]{scale},trim=start={intro_seconds:.3f},setpts=PTS-STARTPTS[rest];"
+                        f"[intro][rest]concat=n=2:v=1:a=0[v]", "-map", "[v]"]
+        else:
+            command += ["-vf", scale]
+        command += ["-f", "rawvideo", "-pix_fmt", pix_fmt, "-"]
+        self.proc = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=0)
+        self.frame = np.empty(frame_shape(size, pix_fmt, channels), dtype=np.uint8)
+        self._view = memoryview(self.frame).cast("B")
+
+    def read(self, out=None):
+        """Read the next frame into the shared buffer (or ``out``); returns it, or None at end of stream"""
+        frame = self.frame if out is None else out
+        view = self._view if out is None else memoryview(out).cast("B")
+        filled = 0
+        while filled < len(view):
+            count = self.proc.stdout.readinto(view[filled:])
+            if not count:
+                return None
+            filled += count
+        return frame
+
+    def close(self):
+        self.proc.stdout.close()
+        self.proc.terminate()
+        self.proc.wait()
+
+
+class SplitBackgroundReader:
+    """One ffmpeg decode of the background, split into several sizes that each get their own pipe
+
+    Sizes with another aspect ratio are scaled to cover and center-cropped
+    (e.g. a 9:16 cut of a 16:9 loop). read() returns one frame per size.
+
+    ffmpeg may write several frames to one output before the next one gets
+    any, so every pipe is drained by its own thread into a bounded queue of
+    recycled buffers; a blocking read of one pipe would stall the others.
+    """
+
+    def __init__(self, path, sizes, fps, loop=False, pix_fmt="rgb24", channels=3):
+        self.sizes = sizes
+        self.fps = fps
+        graph = f"[0:v]fps={fps},split={len(sizes)}" + "".join(f"[s{idx}]" for idx in range(len(sizes)))
+        for idx, (width, height) in enumerate(sizes):
+            graph += (f";[s{idx}]scale={width}:{height}:force_original_aspect_ratio=increase,"
+                      f"crop={width}:{height}[v{idx}]")
+        command = [FFMPEG_BINARY, "-v", "error"] + (["-stream_loop", "-1"] if loop else [])
+        command += ["-i", path, "-an", "-filter_complex", graph]
+        pipes = [os.pipe() for _ in sizes]
+        for idx, (_, write_fd) in enumerate(pipes):
+            command += ["-map", f"[v{idx}]", "-f", "rawvideo", "-pix_fmt", pix_fmt, f"pipe:{write_fd}"]
+        self.proc = subprocess.Popen(command, pass_fds=[write_fd for _, write_fd in pipes])
+        for _, write_fd in pipes:
+            os.close(write_fd)
+        self.streams = [os.fdopen(read_fd, "rb", buffering=0) for read_fd, _ in pipes]
+        self._free = [queue.Queue() for _ in sizes]
+        self._filled = [queue.Queue() for _ in sizes]
+        for free, size in zip(self._free, sizes):
+            for _ in range(SPLIT_QUEUE_FRAMES + 1):  # One more than the queue: the frame the caller holds
+                free.put(np.empty(frame_shape(size, pix_fmt, channels), dtype=np.uint8))
+        self._threads = [threading.Thread(target=self._drain, args=(stream, free, filled), daemon=True)
+                         for stream, free, filled in zip(self.streams, self._free, self._filled)]
+        for thread in self._threads:
+            thread.start()
+        self.frames = None
+
+    @staticmethod
+    def _drain(stream, free, filled):
+        """Reader thread of one pipe: fills free buffers as fast as ffmpeg writes, None marks the end"""
+        try:
+            while True:
+                frame = free.get()
+                if frame is None:
+                    return
+                view = memoryview(frame).cast("B")
+                read = 0
+                while read < len(view):
+                    count = stream.readinto(view[read:])
+                    if not count:
+                        filled.put(None)
+                        return
+                    read += count
+                filled.put(frame)
+        except (OSError, ValueError):
+            filled.put(None)
+
+    def read(self):
+        """The next frame of every size; returns the list, or None at end of stream
+
+        The frames stay valid until the next call, which recycles their buffers.
+        """
+        if self.frames is not None:
+            for free, frame in zip(self._free, self.frames):
+                free.put(frame)
+        frames = [filled.get() for filled in self._filled]
+        self.frames = None if any(frame is None for frame in frames) else frames
+        return self.frames
+
+    def close(self):
+        # Terminating ffmpeg ends every pipe; threads waiting for a buffer get None instead
+        self.proc.terminate()
+        self.proc.wait()
+        for free in self._free:
+            free.put(None)
+        for thread in self._threads:
+            thread.join()
+        for stream in self.streams:
+            stream.close()
+
+
+class FrameWriter:
+    """Feeds raw frames to an ffmpeg encode pipe, muxing the audio track in the same process"""
+
+    def __init__(self, output_path, size, fps, audio_path=None, pix_fmt="rgb24", video_args=None,
+                 audio_output_args=None, extra_input_args=None):
+        command = [FFMPEG_BINARY, "-y", "-v", "error",
+                   "-f", "rawvideo", "-pix_fmt", pix_fmt, "-s", f"{size[0]}x{size[1]}", "-r", str(fps), "-i", "-"]
+        if audio_path:
+            command += (extra_input_args or []) + ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0"]
+            command += audio_output_args or audio_args()
+            command += ["-shortest"]
+        command += (video_args or encoder_args()) + [output_path]
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.proc.stdin.write(frame.data)
+
+    def close(self):
+        self.proc.stdin.close()
+        if self.proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg encoder exited with status {self.proc.returncode}")
+
+
+def open_writer(output_path, size, fps, backend="ffmpeg", **kwargs):
+    """FrameWriter, or av_io.AvFrameWriter for the "pyav" backend"""
+    if backend == "pyav":
+        from av_io import AvFrameWriter
+        return AvFrameWriter(output_path, size, fps, **kwargs)
+    if backend != "ffmpeg":
+        raise ValueError(f"Unknown I/O backend '{backend}', expected one of {IO_BACKENDS}")
+    return FrameWriter(output_path, size, fps, **kwargs)
@@ -0,0 +1,206 @@
+import time
+
+import numpy as np
+
+from clip_index import BUCKET_SECONDS, IntervalIndex
+from background_cache import open_background
+from ffmpeg_io import encoder_args, open_writer
+from yuv_compositor import YuvFrameCompositor
+
+# --- CONFIGURATION ---
+PROGRESS_EVERY = 10.0  # Print render progress every this many seconds of video
+PIXEL_FORMATS = ("rgb24", "yuv420p")
+
+
+def _cue_rect(cue, t, frame_size):
+    """Clipped on-screen (x0, y0, x1, y1) of a cue at global time t, or None when nothing is visible"""
+    (c0, c1), x, y, _ = cue.state(t - cue.start)
+    x0, y0 = max(int(x), 0), max(int(y), 0)
+    x1, y1 = min(int(x) + c1 - c0, frame_size[0]), min(int(y) + cue.height, frame_size[1])
+    return (x0, y0, x1, y1) if x0 < x1 and y0 < y1 else None
+
+
+def _merge_rects(rects):
+    """Union overlapping rectangles so no pixel is blended twice"""
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
+class StaticOverlay:
+    """Premultiplied-alpha overlay of a set of settled cues, blended with one pass per dirty rectangle
+
+    Cues are flattened once (premultiplied "over" in float) into one tile
+    per merged bounding box. Each tile keeps its colour as uint16
+    premultiplied values and 255 - alpha, so a frame costs
+    ``premultiplied + frame * inverse / 255`` per pixel and nothing else,
+    computed in place with a shift-based division by 255.
+    """
+
+    def __init__(self, cues, t, frame_size):
+        self.tiles = []
+        placed = [(cue, _cue_rect(cue, t, frame_size)) for cue in cues]
+        placed = [(cue, rect) for cue, rect in placed if rect is not None]
+        for x0, y0, x1, y1 in _merge_rects(rect for _, rect in placed):
+            canvas = np.zeros((y1 - y0, x1 - x0, 4), dtype=np.float32)
+            for cue, (cx0, cy0, cx1, cy1) in placed:
+                if cx0 >= x0 and cy0 >= y0 and cx1 <= x1 and cy1 <= y1:
+                    self._draw(canvas, cue, t, x0, y0, frame_size)
+            premultiplied = np.rint(canvas[..., :3]).astype(np.uint16)
+            # Inverse alpha repeated per channel: a broadcast multiply is several times slower than a dense one
+            inverse = np.repeat((255 - np.rint(canvas[..., 3:])).astype(np.uint16), 3, axis=2)
+            self.tiles.append(((slice(y0, y1), slice(x0, x1)), premultiplied, inverse,
+                               np.empty_like(premultiplied), np.empty_like(premultiplied)))
+
+    @staticmethod
+    def _draw(canvas, cue, t, x0, y0, frame_size):
+        (c0, c1), x, y, opacity = cue.state(t - cue.start)
+        x, y = int(x), int(y)
+        sx0, sy0 = max(x, 0) - x, max(y, 0) - y
+        sx1, sy1 = min(x + c1 - c0, frame_size[0]) - x, min(y + cue.height, frame_size[1]) - y
+        r, g, b, a = (channel[sy0:sy1, c0 + sx0:c0 + sx1].astype(np.float32) for channel in cue.sprite.channel_views())
+        alpha = a * opacity / 255.0
+        color = np.dstack((r, g, b)) * (opacity if cue.sprite.premultiplied else alpha[..., None])
+        region = canvas[y + sy0 - y0:y + sy1 - y0, x + sx0 - x0:x + sx1 - x0]
+        keep = 1.0 - alpha[..., None]
+        region[..., :3] = color + region[..., :3] * keep
+        region[..., 3] = alpha * 255.0 + region[..., 3] * keep[..., 0]
+
+    def blend_onto(self, frame):
+        for region, premultiplied, inverse, scratch, shifted in self.tiles:
+            target = frame[region]
+            # round(target * inverse / 255) as (x + 128 + ((x + 128) >> 8)) >> 8, all in preallocated buffers
+            np.multiply(target, inverse, out=scratch)
+            scratch += 128
+            np.right_shift(scratch, 8, out=shifted)
+            scratch += shifted
+            scratch >>= 8
+            scratch += premultiplied
+            np.minimum(scratch, 255, out=scratch)
+            np.copyto(target, scratch, casting="unsafe")
+        return frame
+
+
+class FrameCompositor:
+    """Blends cues onto background frames in place, outside of moviepy
+
+    Only the cues active at t (IntervalIndex lookup) are visited and each one
+    is blended inside its own bounding box with uint16 integer math
+    (Cue.blend_onto), so pixels outside subtitle and header boxes are never
+    touched. Frames stay uint8 RGB end to end.
+
+    With ``cache_static`` the settled cues at the bottom of the layer stack
+    are flattened into a StaticOverlay, rebuilt only when that set changes
+    (a cue starts, ends or finishes animating). Cues still animating, and
+    anything layered above them, are blended individually on top.
+    """
+
+    def __init__(self, cues, frame_size, bucket_seconds=BUCKET_SECONDS, cache_static=True):
+        self.cues = list(cues)
+        self.frame_size = tuple(frame_size)
+        self.index = IntervalIndex(self.cues, bucket_seconds)
+        self.cache_static = cache_static
+        self.overlay = None
+        self.overlay_cues = ()
+        self.overlay_builds = 0
+
+    def build_overlay(self, cues, t):
+        self.overlay = StaticOverlay(cues, t, self.frame_size) if cues else None
+        self.overlay_cues = cues
+        self.overlay_builds += 1
+
+    def composite(self, frame, t):
+        active = self.index.active(t)
+        if not self.cache_static:
+            for cue in active:
+                cue.blend_onto(frame, t)
+            return frame
+
+        settled = 0
+        while settled < len(active) and not active[settled].is_animating(t):
+            settled += 1
+        static = tuple(active[:settled])
+        if static != self.overlay_cues:
+            self.build_overlay(static, t)
+        if self.overlay is not None:
+            self.overlay.blend_onto(frame)
+        for cue in active[settled:]:
+            cue.blend_onto(frame, t)
+        return frame
+
+
+def make_compositor(cues, size, pix_fmt="rgb24", cache_static=True):
+    """The compositor for frames of pix_fmt (see PIXEL_FORMATS)"""
+    if pix_fmt == "yuv420p":
+        return YuvFrameCompositor(cues, size)
+    return FrameCompositor(cues, size, cache_static=cache_static)
+
+
+def render_cues(background_path, cues, output_path, size, fps, duration, audio_path=None, loop_background=False,
+                video_args=None, audio_output_args=None, profiler=None, cache_static=True, pix_fmt="rgb24",
+                intro_path=None, intro_seconds=0.0, background_start=0.0, cache_background=False,
+                io_backend="ffmpeg"):
+    """Drop-in for CompositeVideoClip([background] + clips).write_videofile() working on cues
+
+    Background frames come from an ffmpeg decode pipe, are composited in
+    place and go straight to an ffmpeg libx264 encode pipe that also muxes
+    the audio. With pix_fmt="yuv420p" frames stay in the decoder's planar
+    format end to end (YuvFrameCompositor), skipping both RGB conversions.
+    ``intro_path`` / ``intro_seconds`` and ``background_start`` (seek, in
+    seconds) are passed on to BackgroundReader. ``cache_background`` reads a
+    looped background from a BackgroundCache instead of decoding it.
+    ``io_backend`` "pyav" decodes and encodes in process (see av_io).
+    Returns the measured frames per second.
+    """
+    compositor = make_compositor(cues, size, pix_fmt, cache_static)
+    reader = open_background(background_path, size, fps, loop=loop_background, start=background_start,
+                             pix_fmt=pix_fmt, intro_path=intro_path, intro_seconds=intro_seconds,
+                             cache=cache_background, backend=io_backend)
+    writer = open_writer(output_path, size, fps, backend=io_backend, audio_path=audio_path, pix_fmt=pix_fmt,
+                         video_args=video_args or encoder_args(), audio_output_args=audio_output_args)
+
+    read, composite, write = reader.read, compositor.composite, writer.write
+    if profiler:
+        read = profiler.wrap(read, "background")
+        composite = profiler.wrap(composite, "compositor")
+        profiler.instrument_compositor(compositor)
+        write = profiler.wrap(write, "encoder")
+
+    frame_count = int(round(duration * fps))
+    started = time.perf_counter()
+    next_progress = PROGRESS_EVERY
+    written = 0
+    try:
+        for idx in range(frame_count):
+            frame = read()
+            if frame is None:
+                print(f"Background ended after {idx} of {frame_count} frames")
+                break
+            t = idx / fps
+            write(composite(frame, t))
+            written += 1
+            if t >= next_progress:
+                elapsed = time.perf_counter() - started
+                print(f"  {t:.0f}/{duration:.0f}s rendered ({written / elapsed:.1f} fps)")
+                next_progress += PROGRESS_EVERY
+    finally:
+        reader.close()
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    measured_fps = written / elapsed if elapsed else 0.0
+    print(f"Composited {written} frames in {elapsed:.1f}s ({measured_fps:.1f} fps, "
+          f"{compositor.overlay_builds} overlay rebuilds)")
+    return measured_fps
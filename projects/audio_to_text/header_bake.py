@@ -0,0 +1,54 @@
+import copy
+import math
+
+from ffmpeg_io import encoder_args, probe_duration
+from frame_compositor import render_cues
+
+# --- CONFIGURATION ---
+BAKE_PRESET = "veryfast"
+BAKE_CRF = 12  # Near-lossless: the baked loop is encoded once more in the final render
+
+
+def intro_length(header_cues, fps):
+    """Seconds until every header cue has settled, rounded up to a whole frame"""
+    settle = max((cue.animation.duration for cue in header_cues), default=0.0)
+    settle = max([settle] + [cue.animation.fade_in for cue in header_cues])
+    return math.ceil(settle * fps) / fps
+
+
+def settled(cue, start, duration):
+    """Copy of a cue that is already fully revealed at t=0 and lasts ``duration`` seconds
+
+    ``start`` is negative (minus the intro length): the cue is placed as if
+    it had started that long before the loop, which IntervalIndex clamps to
+    its first bucket.
+    """
+    if start > 0:
+        raise ValueError(f"A settled cue must start at or before t=0, got {start}")
+    cue = copy.copy(cue)
+    cue.start = start
+    cue.duration = duration - start
+    return cue
+
+
+def bake_header(background_path, header_cues, intro_path, loop_path, size, fps, pix_fmt="rgb24"):
+    """Composite the header into the background once, so only subtitles are composited per frame
+
+    Writes ``loop_path``: one period of the background with the settled
+    header, to be looped like the background itself; and ``intro_path``:
+    the first seconds with the animated header. Returns the intro length,
+    for render_cues(intro_path=..., intro_seconds=...). Header cues must
+    not fade out, since they are frozen in their settled state.
+    """
+    intro_seconds = intro_length(header_cues, fps)
+    period = probe_duration(background_path)
+    video_args = encoder_args(preset=BAKE_PRESET, crf=BAKE_CRF)
+
+    print(f"Baking the header into a {period:.1f}s background loop...")
+    render_cues(background_path, [settled(cue, -intro_seconds, period) for cue in header_cues], loop_path,
+                size, fps, period, video_args=video_args, pix_fmt=pix_fmt)
+    if intro_seconds > 0:
+        print(f"Rendering the {intro_seconds:.2f}s animated header intro...")
+        render_cues(background_path, header_cues, intro_path, size, fps, intro_seconds, loop_background=True,
+                    video_args=video_args, pix_fmt=pix_fmt)
+    return intro_seconds
@@ -0,0 +1,116 @@
+import os
+import subprocess
+import time
+
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+
+from clip_index import IntervalIndex
+from ffmpeg_io import FrameWriter, audio_args, encoder_args
+
+# --- CONFIGURATION ---
+# Alpha-capable intermediates: the container each one needs, encoder arguments and decoder (input) arguments
+OVERLAY_FORMATS = {
+    "qtrle": (".mov", ["-c:v", "qtrle", "-pix_fmt", "argb"], []),  # QuickTime RLE, lossless, fast to decode
+    "png": (".mkv", ["-c:v", "png", "-pix_fmt", "rgba"], []),  # PNG-in-MKV, lossless, smaller, slower
+    # Lossy, smallest; ffmpeg's native vp9 decoder drops the alpha plane, libvpx keeps it
+    "vp9": (".webm", ["-c:v", "libvpx-vp9", "-pix_fmt", "yuva420p", "-crf", "30", "-b:v", "0",
+                      "-row-mt", "1", "-auto-alt-ref", "0"], ["-c:v", "libvpx-vp9"]),
+}
+DEFAULT_OVERLAY_FORMAT = "qtrle"
+PROGRESS_EVERY = 60.0  # Print render progress every this many seconds of video
+
+
+def overlay_path(base_path, overlay_format=DEFAULT_OVERLAY_FORMAT):
+    """base_path with the extension the overlay format's container needs"""
+    return os.path.splitext(base_path)[0] + OVERLAY_FORMATS[overlay_format][0]
+
+
+def _draw_cue(canvas, cue, t):
+    """Draw a cue "over" a straight-alpha RGBA canvas at global time t; returns the touched rect or None"""
+    ct = t - cue.start
+    (c0, c1), x, y, opacity = cue.state(ct)
+    if c1 <= c0 or opacity <= 0:
+        return None
+    x, y = int(x), int(y)
+    frame_h, frame_w = canvas.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + c1 - c0, frame_w), min(y + cue.height, frame_h)
+    if x0 >= x1 or y0 >= y1:
+        return None
+
+    pixels = cue.rgba(ct)[y0 - y:y1 - y, c0 + x0 - x:c0 + x1 - x]
+    region = canvas[y0:y1, x0:x1]
+    if not region[..., 3].any():
+        # Nothing underneath (the usual case): the sprite is copied with its alpha scaled
+        region[..., :3] = pixels[..., :3]
+        region[..., 3] = pixels[..., 3] if opacity >= 1.0 else np.rint(pixels[..., 3] * opacity)
+        return x0, y0, x1, y1
+
+    src_alpha = pixels[..., 3:].astype(np.float32) * (opacity / 255.0)
+    dst_alpha = region[..., 3:].astype(np.float32) / 255.0 * (1.0 - src_alpha)
+    out_alpha = src_alpha + dst_alpha
+    color = (pixels[..., :3] * src_alpha + region[..., :3] * dst_alpha) / np.maximum(out_alpha, 1e-6)
+    region[..., :3] = np.rint(color)
+    region[..., 3:] = np.rint(out_alpha * 255.0)
+    return x0, y0, x1, y1
+
+
+def render_overlay(cues, output_path, size, fps, duration, overlay_format=DEFAULT_OVERLAY_FORMAT):
+    """Render only the cue layers onto a transparent canvas and encode them with alpha
+
+    The canvas is redrawn only while the set of active cues changes or one
+    of them is animating, and then only the rectangles drawn last time are
+    cleared; otherwise the previous frame is written again.
+    Returns the measured frames per second.
+    """
+    index = IntervalIndex(cues)
+    canvas = np.zeros((size[1], size[0], 4), dtype=np.uint8)
+    writer = FrameWriter(output_path, size, fps, pix_fmt="rgba", video_args=OVERLAY_FORMATS[overlay_format][1])
+
+    frame_count = int(round(duration * fps))
+    drawn_rects, drawn_cues = [], None
+    redraws = 0
+    started = time.perf_counter()
+    next_progress = PROGRESS_EVERY
+    try:
+        for idx in range(frame_count):
+            t = idx / fps
+            active = index.active(t)
+            if active != drawn_cues or any(cue.is_animating(t) for cue in active):
+                for x0, y0, x1, y1 in drawn_rects:
+                    canvas[y0:y1, x0:x1] = 0
+                drawn_rects = [rect for rect in (_draw_cue(canvas, cue, t) for cue in active) if rect is not None]
+                drawn_cues = active
+                redraws += 1
+            writer.write(canvas)
+            if t >= next_progress:
+                elapsed = time.perf_counter() - started
+                print(f"  {t:.0f}/{duration:.0f}s of overlay rendered ({(idx + 1) / elapsed:.1f} fps)")
+                next_progress += PROGRESS_EVERY
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    measured_fps = frame_count / elapsed if elapsed else 0.0
+    print(f"Rendered {frame_count} overlay frames ({redraws} redrawn) in {elapsed:.1f}s ({measured_fps:.1f} fps)")
+    return measured_fps
+
+
+def apply_overlay(background_path, overlay_video_path, audio_path, output_path, size, fps, duration,
+                  loop_background=True, video_args=None, audio_output_args=None, overlay_format=DEFAULT_OVERLAY_FORMAT):
+    """Composite a rendered overlay onto any background in one ffmpeg process
+
+    The background is scaled to ``size`` and the overlay is scaled to match,
+    so one overlay serves several output resolutions of the same aspect ratio.
+    ``overlay_format`` selects the decoder that keeps the overlay's alpha.
+    """
+    filter_graph = (f"[0:v]scale={size[0]}:{size[1]},fps={fps}[bg];"
+                    f"[1:v]scale={size[0]}:{size[1]},format=rgba[ov];"
+                    f"[bg][ov]overlay=eof_action=pass:format=auto,format=yuv420p[vout]")
+    command = [FFMPEG_BINARY, "-y", "-v", "error", "-stats"]
+    command += (["-stream_loop", "-1"] if loop_background else []) + ["-i", background_path]
+    command += OVERLAY_FORMATS[overlay_format][2] + ["-i", overlay_video_path, "-i", audio_path]
+    command += ["-filter_complex", filter_graph, "-map", "[vout]", "-map", "2:a:0", "-t", f"{duration:.3f}"]
+    command += (video_args or encoder_args()) + (audio_output_args or audio_args()) + [output_path]
+    subprocess.run(command, check=True)
@@ -0,0 +1,152 @@
+import math
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from background_cache import open_background
+from ffmpeg_io import encoder_args, frame_shape, open_writer
+from frame_compositor import PROGRESS_EVERY, make_compositor
+
+# --- CONFIGURATION ---
+CHUNK_FRAMES = 8  # Consecutive frames composited by one task, so a worker's static overlay stays valid
+RING_CHUNKS_PER_WORKER = 3  # Ring buffer slots (in chunks) per worker: one being filled, one composited, one queued
+LIVENESS_POLL_SECONDS = 1.0  # How often a blocked reader checks that the workers and the writer are still running
+_END = -1
+
+
+def _ring_frames(shm, ring_chunks, shape):
+    return np.ndarray((ring_chunks, CHUNK_FRAMES) + shape, dtype=np.uint8, buffer=shm.buf)
+
+
+def _composite_worker(shm, ring_chunks, shape, cues, size, fps, pix_fmt, cache_static, tasks, done):
+    """Composites whole chunks in place in the ring buffer; only chunk numbers travel through the queues"""
+    ring = _ring_frames(shm, ring_chunks, shape)
+    compositor = make_compositor(cues, size, pix_fmt, cache_static)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        chunk, count = task
+        frames = ring[chunk % ring_chunks]
+        first = chunk * CHUNK_FRAMES
+        for idx in range(count):
+            compositor.composite(frames[idx], (first + idx) / fps)
+        done.put((chunk, count))
+
+
+def _writer(shm, ring_chunks, shape, free, done, writer_args, writer_kwargs):
+    """Writes finished chunks to the encoder in order and hands their ring slots back to the reader"""
+    ring = _ring_frames(shm, ring_chunks, shape)
+    writer = open_writer(*writer_args, **writer_kwargs)
+    pending, next_chunk, total = {}, 0, None
+    try:
+        while total is None or next_chunk < total:
+            chunk, count = done.get()
+            if chunk == _END:
+                total = count
+                continue
+            pending[chunk] = count
+            while next_chunk in pending:
+                frames = ring[next_chunk % ring_chunks]
+                for idx in range(pending.pop(next_chunk)):
+                    writer.write(frames[idx])
+                free.release()
+                next_chunk += 1
+    finally:
+        writer.close()
+
+
+def _check_processes(pool, writer):
+    """Raise if a worker or the writer died, instead of waiting forever for its chunks or ring slots"""
+    for process in pool + [writer]:
+        if process.exitcode not in (None, 0):
+            role = "Frame writer" if process is writer else "Compositing worker"
+            raise RuntimeError(f"{role} {process.name} exited with status {process.exitcode}")
+
+
+def render_cues_parallel(background_path, cues, output_path, size, fps, duration, audio_path=None,
+                         loop_background=False, video_args=None, audio_output_args=None, cache_static=True,
+                         pix_fmt="rgb24", intro_path=None, intro_seconds=0.0, workers=None,
+                         cache_background=False, io_backend="ffmpeg"):
+    """render_cues with compositing spread over a pool of worker processes
+
+    The background is decoded straight into a multiprocessing.shared_memory
+    ring of frame chunks. Workers composite whole chunks in place and a
+    writer process feeds them to the encoder in order, so frames are never
+    pickled: only chunk numbers go through the queues. Workers are forked,
+    which also lets them inherit cues whose frame_source can't be pickled.
+    If any process dies the others are terminated and a RuntimeError is
+    raised. Returns the measured frames per second.
+    """
+    workers = workers or os.cpu_count()
+    context = multiprocessing.get_context("fork")
+    shape = frame_shape(size, pix_fmt)
+    ring_chunks = workers * RING_CHUNKS_PER_WORKER
+    shm = shared_memory.SharedMemory(create=True, size=ring_chunks * CHUNK_FRAMES * math.prod(shape))
+    ring = _ring_frames(shm, ring_chunks, shape)
+
+    tasks, done, free = context.Queue(), context.Queue(), context.Semaphore(ring_chunks)
+    pool = [context.Process(target=_composite_worker, daemon=True,
+                            args=(shm, ring_chunks, shape, cues, size, fps, pix_fmt, cache_static, tasks, done))
+            for _ in range(workers)]
+    writer = context.Process(target=_writer, args=(
+        shm, ring_chunks, shape, free, done, (output_path, size, fps),
+        dict(backend=io_backend, audio_path=audio_path, pix_fmt=pix_fmt, video_args=video_args or encoder_args(),
+             audio_output_args=audio_output_args)))
+    for process in pool + [writer]:
+        process.start()
+
+    reader = open_background(background_path, size, fps, loop=loop_background, pix_fmt=pix_fmt,
+                             intro_path=intro_path, intro_seconds=intro_seconds, cache=cache_background,
+                             backend=io_backend)
+    frame_count = int(round(duration * fps))
+    started = time.perf_counter()
+    next_progress = PROGRESS_EVERY
+    read_frames = chunks = 0
+    frames = None
+    try:
+        while read_frames < frame_count:
+            while not free.acquire(timeout=LIVENESS_POLL_SECONDS):
+                _check_processes(pool, writer)
+            frames = ring[chunks % ring_chunks]
+            count = 0
+            while count < min(CHUNK_FRAMES, frame_count - read_frames) and reader.read(frames[count]) is not None:
+                count += 1
+            if count:
+                tasks.put((chunks, count))
+                chunks += 1
+                read_frames += count
+            if count < CHUNK_FRAMES and read_frames < frame_count:
+                print(f"Background ended after {read_frames} of {frame_count} frames")
+                break
+            if read_frames / fps >= next_progress:
+                elapsed = time.perf_counter() - started
+                print(f"  {read_frames / fps:.0f}/{duration:.0f}s decoded ({read_frames / elapsed:.1f} fps)")
+                next_progress += PROGRESS_EVERY
+        for _ in pool:
+            tasks.put(None)
+        done.put((_END, chunks))
+        while writer.exitcode is None:
+            writer.join(LIVENESS_POLL_SECONDS)
+            _check_processes(pool, writer)
+        for process in pool:
+            process.join()
+    except BaseException:
+        for process in pool + [writer]:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        raise
+    finally:
+        reader.close()
+        del ring, frames
+        shm.close()
+        shm.unlink()
+
+    elapsed = time.perf_counter() - started
+    measured_fps = read_frames / elapsed if elapsed else 0.0
+    print(f"Composited {read_frames} frames on {workers} workers in {elapsed:.1f}s ({measured_fps:.1f} fps)")
+    return measured_fps
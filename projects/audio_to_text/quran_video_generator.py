@@ -1,3 +1,4 @@
+import contextlib
 import json
 import re
 import os
@@ -11,17 +12,39 @@ import arabic_reshaper
 from bidi.algorithm import get_display
 from moviepy import *
 from moviepy.video.fx import FadeIn, FadeOut
-import ffmpeg
 import argparse
+from text_layout import DEFAULT_SHAPING_BACKEND, SHAPING_BACKENDS
+from text_renderer import DEFAULT_TEXT_RENDERER, TEXT_RENDERERS, CachedRenderer, get_renderer
+from word_highlight import create_word_highlight_animation
+from animation import Animation, Cue, typewriter_steps
+from render_profiler import RenderProfiler
+from clip_index import IndexedCompositeVideoClip
+from ffmpeg_io import IO_BACKENDS, VideoInfo, audio_args, encoder_args, keyframe_args, probe_duration, probe_video
+from encoder_profile import moviepy_write_kwargs
+from audio_cache import cached_audio
+from ayah_clips import keyframe_times
+from ffmpeg_filtergraph import render_filtergraph
+from overlay_video import DEFAULT_OVERLAY_FORMAT, OVERLAY_FORMATS, apply_overlay, overlay_path, render_overlay
+from frame_compositor import PIXEL_FORMATS, render_cues
+from header_bake import bake_header
+from parallel_render import render_cues_parallel
+from segment_render import render_segments
+from variant_render import Variant, render_variants
+from vfr_render import DEFAULT_BASE_FPS, render_cues_vfr, vfr_video_args
 
 # --- CONFIGURATION ---
 # Base paths that will be formatted with the surah number
 BASE_JSON_PATH = "quran/{}.json"
 BASE_AUDIO_PATH = "data/{}.mp3"
 BASE_INIT_VIDEO_PATH = "data/quran.mp4"
-BASE_TEMP_MERGED_PATH = "data/{}-init.mp4"
 BASE_SUBS_PATH = "data/{}_subtitles.srt"
 BASE_OUTPUT_VIDEO_PATH = "data/{}-video.mp4"
+BASE_VARIANT_OUTPUT_PATH = "data/{}-video-{}.mp4"  # Surah number and variant name
+BASE_OVERLAY_VIDEO_PATH = "data/{}-overlay"  # Extension comes from the overlay format
+BASE_HEADER_INTRO_PATH = "data/{}-header-intro.mp4"
+BASE_HEADER_LOOP_PATH = "data/{}-header-loop.mp4"
+BASE_PROFILE_REPORT_PATH = "data/{}-profile.txt"
+BASE_PROFILE_TRACE_PATH = "data/{}-profile.folded"
 TEMP_DIR = "data/temp_subtitle_images"
 CHAPTERS_PATH = "quran/chapters.json"
 
@@ -47,6 +70,33 @@ CHAR_ANIMATION_DELAY = 0.05
 HEADER_CHAR_ANIMATION_DELAY = 0.5
 FADE_DURATION = 0.01
 ARABIC_ANIMATION_SPEED = 0.05  # Speed of Arabic text reveal (lower is faster)
+SUBTITLE_SIDE_MARGIN = 80  # Long verses wrap to the video width minus this margin on each side
+TYPEWRITER_REVEAL = False  # Snap subtitle wipes to whole letter clusters (PIL renderer) instead of a pixel wipe
+SHAPING_BACKEND = DEFAULT_SHAPING_BACKEND  # "reshaper" (arabic_reshaper + python-bidi) or "raqm" (HarfBuzz)
+TEXT_RENDERER = DEFAULT_TEXT_RENDERER  # "pil" or "cairo" (Pango/Cairo)
+HIGHLIGHT_WORDS = False  # Highlight the word being recited using the verse_timings segments
+PROFILE_RENDER = False  # Record per-layer frame costs and write a report next to the output
+RENDER_ENGINES = ("moviepy", "numpy", "ffmpeg", "overlay")
+# "moviepy" uses CompositeVideoClip, "numpy" blends cues in place between ffmpeg pipes,
+# "ffmpeg" writes the sprites once and composites them with an ffmpeg overlay filtergraph,
+# "overlay" renders the text layers once per surah into an alpha video reused for every background
+RENDER_ENGINE = "moviepy"
+PIXEL_FORMAT = "rgb24"  # Numpy engine compositing domain: "rgb24", or "yuv420p" to blend on the decoder's planes
+RENDER_WORKERS = 1  # Numpy engine: compositing processes (more than 1 renders through a shared-memory ring)
+CACHE_BACKGROUND = False  # Numpy engine: decode the background loop once into a shared memory-mapped raw file
+IO_BACKEND = "ffmpeg"  # Numpy engine: "ffmpeg" pipes, or "pyav" to decode and encode in process
+RENDER_SEGMENTS = 1  # Numpy engine: verse-aligned segments rendered in parallel processes and joined by stream copy
+VFR_RENDER = False  # Numpy engine: only composite and encode frames that change (needs PyAV)
+VFR_BASE_FPS = DEFAULT_BASE_FPS  # Background frame rate in VFR mode, cue animations keep the full rate
+BAKE_HEADER = False  # Numpy engine: composite the settled header into the background loop once
+OVERLAY_FORMAT = DEFAULT_OVERLAY_FORMAT  # "qtrle" (.mov), "png" (.mkv) or "vp9" (.webm)
+VIDEO_VARIANTS = {
+    "landscape": Variant("landscape", (1920, 1080)),
+    "720p": Variant("720p", (1280, 720)),
+    "vertical": Variant("vertical", (1080, 1920)),
+}
+OUTPUT_VARIANTS = []  # Numpy engine: names from VIDEO_VARIANTS rendered together from one background decode
+VERSE_KEYFRAMES = True  # Keyframe on the first frame of every verse, so ayah_clips.py can cut clips with -c copy
 
 
 # --- DOWNLOAD FUNCTION ---
@@ -92,7 +142,7 @@ def clean_html_tags(text: str) -> str:
     return re.sub(r'[˹˺]', '', text).strip()
 
 
-def generate_srt(data):
+def generate_srt(data, translation="en_text"):
     verse_timings = data["audio"]["audio_files"][0]["verse_timings"]
     verses = {v["verse_key"]: v for v in data["surah_verses"]}
 
@@ -105,7 +155,7 @@ def generate_srt(data):
             continue
 
         arabic = verses[verse_key]["arabic_text"]
-        english = clean_html_tags(verses[verse_key]["en_text"])
+        english = clean_html_tags(verses[verse_key][translation])
 
         start_time = ms_to_srt_time(timing["timestamp_from"])
         end_time = ms_to_srt_time(timing["timestamp_to"])
@@ -129,6 +179,22 @@ def json_to_srt(json_file, srt_file):
         f.write(srt_content)
 
 
+def load_subs(json_file, translation="en_text"):
+    """Subtitles of a surah with the given translation, built in memory"""
+    with open(json_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return pysrt.from_string(generate_srt(data, translation))
+
+
+def load_verse_segments(json_file):
+    """Word segments of every verse, in the same order as the cues generate_srt writes"""
+    with open(json_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    verse_timings = data["audio"]["audio_files"][0]["verse_timings"]
+    verses = {v["verse_key"] for v in data["surah_verses"]}
+    return [timing["segments"] for timing in verse_timings if timing["verse_key"] in verses]
+
+
 # --- SUBTITLE GENERATION FUNCTIONS ---
 def setup_environment():
     """Initialize directories and fonts"""
@@ -169,83 +235,15 @@ def preprocess_subtitle(line, font, is_arabic=False):
     return line, total_width, total_height
 
 
-def create_arabic_animation(line, font, color, duration, total_width, total_height):
-    """Create an animated Arabic text clip with proper channel handling"""
-    display_text = line
-
-    # Create background image with consistent dimensions
-    bg_img = Image.new('RGBA', (total_width + 20, total_height + 20), (0, 0, 0, 0))
-    draw_bg = ImageDraw.Draw(bg_img)
-    draw_bg.rounded_rectangle([(0, 0), (total_width + 20, total_height + 20)],
-                              radius=15, fill=BG_COLOR)
-
-    def make_frame(t):
-        """Generate frame at time t with animated text"""
-        # Create a new image with the background
-        frame_img = bg_img.copy()
-        draw = ImageDraw.Draw(frame_img)
-
-        # Calculate how many characters to show
-        # chars_to_show = int(len(display_text) * progress)
-        chars_to_show = int(len(line) * min(1, t / (len(line) * ARABIC_ANIMATION_SPEED)))
-        visible_text = display_text[:chars_to_show]
-
-        # Calculate text position (right-aligned)
-        text_width = font.getlength(visible_text)
-        x_pos = (total_width + 20) - text_width - 10  # Right padding
-        y_pos = 10
-
-        # print(f"x: {x_pos} y: {y_pos} => {visible_text}")
-
-        # Draw the visible portion of the text
-        draw.text((x_pos, y_pos), visible_text, font=font, fill=color)
-
-        # Convert to numpy array and ensure RGBA format
-        frame_array = np.array(frame_img)
-        if frame_array.shape[2] == 3:  # If RGB, add alpha channel
-            alpha = np.full(frame_array.shape[:2], 255, dtype=np.uint8)
-            frame_array = np.dstack((frame_array, alpha))
-        return frame_array
-
-    # Create clip with ismask=False to indicate this is not a mask
-    return VideoClip(make_frame, duration=duration, is_mask=False)
-
-
-def create_english_animation(line, font, color, duration, total_width, total_height):
-    """Create left-to-right animation for English text"""
-    bg_img = Image.new('RGBA', (total_width + 20, total_height + 20), (0, 0, 0, 0))
-    draw_bg = ImageDraw.Draw(bg_img)
-    draw_bg.rounded_rectangle([(0, 0), (total_width + 20, total_height + 20)],
-                              radius=15, fill=BG_COLOR)
-
-    def make_frame(t):
-        # progress = min(1.0, max(0.0, t / duration))
-        frame_img = bg_img.copy()
-        draw = ImageDraw.Draw(frame_img)
-
-        # chars_to_show = int(len(line) * progress)
-        chars_to_show = int(len(line) * min(1, t / (len(line) * CHAR_ANIMATION_DELAY)))
-        visible_text = line[:chars_to_show]
-
-        # Left-aligned for English
-        draw.text((10, 10), visible_text, font=font, fill=color)
-
-        frame_array = np.array(frame_img)
-        if frame_array.shape[2] == 3:
-            alpha = np.full(frame_array.shape[:2], 255, dtype=np.uint8)
-            frame_array = np.dstack((frame_array, alpha))
-        return frame_array
-
-    return VideoClip(make_frame, duration=duration, is_mask=False)
-
-
-def process_subtitle_line(line, font, color, is_arabic=False, duration=5.0):
+def process_subtitle_line(line, font, color, is_arabic=False, duration=5.0, max_width=None, renderer=None):
     """Process a subtitle line with proper image format handling"""
     # processed_line, total_width, total_height = preprocess_subtitle(line, font, is_arabic)
+    renderer = renderer or get_renderer(TEXT_RENDERER, SHAPING_BACKEND)
 
     if is_arabic:
-        # return create_arabic_animation(processed_line, font, color, duration, total_width, total_height)
-        return create_slide_animation(
+        sprite = renderer.render(line, FONT_ARABIC_PATH, FONT_SIZE_ARABIC, is_rtl=True, max_width=max_width,
+                                 h_pad=60, is_draw_bg=True)
+        line_cue, canvas_width, canvas_height = create_slide_animation(
             text=line,
             font_path=FONT_ARABIC_PATH,
             font_size=FONT_SIZE_ARABIC,
@@ -253,9 +251,13 @@ def process_subtitle_line(line, font, color, is_arabic=False, duration=5.0):
             bg_color=(0, 0, 0, 0),
             is_rtl=True,
             is_draw_bg=True,
-            h_pad=60)
+            h_pad=60,
+            fade_in=FADE_DURATION,
+            sprite=sprite)
     else:
-        return create_slide_animation(
+        sprite = renderer.render(line, FONT_ENGLISH_PATH, FONT_SIZE, is_rtl=False, max_width=max_width,
+                                 h_pad=40, is_draw_bg=True)
+        line_cue, canvas_width, canvas_height = create_slide_animation(
             text=line,
             font_path=FONT_ENGLISH_PATH,
             font_size=FONT_SIZE,
@@ -263,84 +265,49 @@ def process_subtitle_line(line, font, color, is_arabic=False, duration=5.0):
             bg_color=(0, 0, 0, 0),
             is_rtl=False,
             is_draw_bg=True,
-            h_pad=40)
-        # English animation (left-to-right)
-        # return create_english_animation(processed_line, font, color, duration, total_width, total_height)
+            h_pad=40,
+            fade_in=FADE_DURATION,
+            sprite=sprite)
+
+    # Wrapped lines grow the canvas upwards by extra_height
+    return line_cue, canvas_width, canvas_height, sprite.extra_height
+
 
+def create_slide_animation(text, font_path, font_size, duration, bg_color, is_rtl=True, is_draw_bg=False, h_pad=40,
+                           max_width=None, sprite=None, renderer=None, fade_in=0.0, typewriter=TYPEWRITER_REVEAL):
+    """Create a sliding reveal that completes within 3 seconds max and stays visible
 
-def create_slide_animation(text, font_path, font_size, duration, bg_color, is_rtl=True, is_draw_bg=False, h_pad=40):
-    """Create sliding animation that completes within 5 seconds max and stays visible"""
-    # Calculate animation duration (min of 5 seconds or total_duration)
+    Returns an unplaced Cue (cached sprite + wipe/fade transforms), see animation.Cue.place / to_clip.
+    ``typewriter`` reveals whole clusters at a time, for sprites that carry their layout.
+    """
+    # Calculate animation duration (min of 3 seconds or total_duration)
     anim_duration = min(3.0, duration)
 
-    # Prepare text (RTL for Arabic)
-    if is_rtl:
-        configuration = {
-            'delete_harakat': False,
-            'support_ligatures': True,
-            'RIAL SIGN': True,
-        }
-        reshaper = arabic_reshaper.ArabicReshaper(configuration=configuration)
-        reshaped_text = reshaper.reshape(text)
-        display_text = get_display(reshaped_text)
-        # display_text = display_text[::-1] # set it for linux
-    else:
-        display_text = text
+    # Render the text once (RTL for Arabic); long verses wrap to max_width
+    if sprite is None:
+        renderer = renderer or get_renderer(TEXT_RENDERER, SHAPING_BACKEND)
+        sprite = renderer.render(text, font_path, font_size, is_rtl=is_rtl, max_width=max_width, h_pad=h_pad,
+                                 is_draw_bg=is_draw_bg, bg_color=bg_color)
 
-    # Load font
-    try:
-        font = ImageFont.truetype(font_path, font_size)
-    except:
-        font = ImageFont.truetype(FALLBACK_FONT_PATH, font_size)
-
-    # Calculate dimensions
-    text_bbox = font.getbbox(display_text)
-    text_width = text_bbox[2] - text_bbox[0]
-    text_height = text_bbox[3] - text_bbox[1]
-
-    # Create canvas
-    canvas_width = text_width + 40
-    canvas_height = text_height + h_pad
-    bg_img = Image.new("RGBA", (int(canvas_width), int(canvas_height)), bg_color)
-    draw = ImageDraw.Draw(bg_img)
-
-    # Draw background
-    if is_draw_bg:
-        draw.rounded_rectangle([(0, 0), (canvas_width, canvas_height)],
-                               radius=15, fill=BG_COLOR)
-
-    # Position text
-    x_pos = canvas_width - text_width - 10 if is_rtl else 10
-    draw.text((x_pos, 10), display_text, font=font, fill="white")
-    full_text_array = np.array(bg_img)
-
-    def make_frame(t):
-        if t < anim_duration:  # Animation phase
-            progress = min(1.0, t / anim_duration)
-            visible_width = int(canvas_width * progress)
-
-            if is_rtl:  # RTL: crop from right
-                cropped = full_text_array[:, -visible_width:] if visible_width > 0 else full_text_array[:, :0]
-                padding = np.zeros((canvas_height, canvas_width - visible_width, 4), dtype=np.uint8)
-                frame = np.hstack([padding, cropped])
-            else:  # LTR: crop from left
-                cropped = full_text_array[:, :visible_width] if visible_width > 0 else full_text_array[:, :0]
-                padding = np.zeros((canvas_height, canvas_width - visible_width, 4), dtype=np.uint8)
-                frame = np.hstack([cropped, padding])
-        else:  # After animation - show full text
-            frame = full_text_array
-
-        return frame
-
-    return VideoClip(make_frame, duration=duration), canvas_width, canvas_height
-
-
-def create_subtitle_clips(video, subs, font_english, font_arabic):
-    """Generate subtitle clips with proper compositing"""
-    subtitle_clips = []
+    # RTL reveals from the right, LTR from the left
+    steps = typewriter_steps(sprite) if typewriter else None
+    animation = Animation(duration=anim_duration, fade_in=fade_in, wipe="rtl" if is_rtl else "ltr",
+                          typewriter_steps=steps)
+    cue = Cue(sprite, animation, duration=duration, name=text[:40])
+    return cue, sprite.width, sprite.height
+
+
+def create_subtitle_cues(video, subs, font_english, font_arabic, renderer=None, verse_segments=None,
+                         shaping_backend=SHAPING_BACKEND):
+    """Generate positioned subtitle cues
+
+    When verse_segments (see load_verse_segments) is given, Arabic lines highlight the recited word.
+    """
+    subtitle_cues = []
     video_size = video.size
+    max_width = video_size[0] - 2 * SUBTITLE_SIDE_MARGIN
 
-    for sub in subs:
+    for sub_idx, sub in enumerate(subs):
         lines = sub.text.split('\n')
         start_time = sub.start.ordinal / 1000
         end_time = sub.end.ordinal / 1000
@@ -362,60 +329,64 @@ def create_subtitle_clips(video, subs, font_english, font_arabic):
             else:
                 english_lines.append(line)
 
+        # Build English lines first so Arabic rows can sit above however many rows they wrapped into
+        english_items = [process_subtitle_line(line, font_english, COLOR_ENGLISH, False, duration, max_width,
+                                               renderer)
+                         for line in english_lines]
+        english_lift = sum(item[3] for item in english_items)
+
+        arabic_lift = english_lift
         for line_idx, line in enumerate(arabic_lines):
             font = font_arabic
             color = COLOR_ARABIC
-            line_clip, canvas_width, canvas_height = process_subtitle_line(line, font, color, True, duration)
+            if verse_segments is not None:
+                line_cue, canvas_width, canvas_height, extra_height = create_word_highlight_animation(
+                    line, FONT_ARABIC_PATH, FONT_SIZE_ARABIC, verse_segments[sub_idx], sub.start.ordinal, duration,
+                    is_rtl=True, max_width=max_width, renderer=renderer, fps=video.fps,
+                    animation=Animation(duration=min(3.0, duration), fade_in=FADE_DURATION, wipe="rtl"),
+                    shaping_backend=shaping_backend)
+            else:
+                line_cue, canvas_width, canvas_height, extra_height = process_subtitle_line(line, font, color, True,
+                                                                                            duration, max_width,
+                                                                                            renderer)
+            arabic_lift += extra_height
 
             # Position the clip
             # _, total_width, total_height = preprocess_subtitle(line, font, True)
             # y_pos = video_size[1] - SUBTITLE_HEIGHT - line_idx * LINE_SPACING
-            y_pos = video_size[1] - SUBTITLE_HEIGHT - (len(english_lines) * LINE_SPACING) - line_idx * LINE_SPACING - 80
+            y_pos = video_size[1] - SUBTITLE_HEIGHT - (len(english_lines) * LINE_SPACING) - line_idx * LINE_SPACING - 80 \
+                - arabic_lift
             x_pos = (video_size[0] - canvas_width) / 2
 
-            try:
-                # Set clip properties
-                # Configure clip using current MoviePy API
-                positioned_clip = line_clip.with_position((x_pos, y_pos)) \
-                    .with_start(start_time) \
-                    .with_duration(duration)
-
-                positioned_clip = positioned_clip.with_effects([vfx.FadeIn(FADE_DURATION, initial_color=[0, 0, 0, 0])])
-
-                subtitle_clips.append(positioned_clip)
-            except Exception as ex:
-                print(ex)
+            # Wipe and fade are evaluated by the cue itself, no moviepy effects or mask clips
+            subtitle_cues.append(line_cue.place(x_pos, y_pos, start_time))
 
-        for line_idx, line in enumerate(english_lines):
-            font = font_english
-            color = COLOR_ENGLISH
-            line_clip, canvas_width, canvas_height = process_subtitle_line(line, font, color, False, duration)
+        english_lift = 0
+        for line_idx, (line_cue, canvas_width, canvas_height, extra_height) in enumerate(english_items):
+            english_lift += extra_height
 
             # Position the clip
             # _, total_width, total_height = preprocess_subtitle(line, font, False)
             # y_pos = video_size[1] - SUBTITLE_HEIGHT - line_idx * LINE_SPACING
-            y_pos = video_size[1] - SUBTITLE_HEIGHT - line_idx * LINE_SPACING
+            y_pos = video_size[1] - SUBTITLE_HEIGHT - line_idx * LINE_SPACING - english_lift
             x_pos = (video_size[0] - canvas_width) / 2
 
-            try:
-                # Set clip properties
-                # Configure clip using current MoviePy API
-                positioned_clip = line_clip.with_position((x_pos, y_pos)) \
-                    .with_start(start_time) \
-                    .with_duration(duration)
+            # Wipe and fade are evaluated by the cue itself, no moviepy effects or mask clips
+            subtitle_cues.append(line_cue.place(x_pos, y_pos, start_time))
 
-                positioned_clip = positioned_clip.with_effects([vfx.FadeIn(FADE_DURATION, initial_color=[0, 0, 0, 0])])
+    return subtitle_cues
 
-                subtitle_clips.append(positioned_clip)
-            except Exception as ex:
-                print(ex)
 
-    return subtitle_clips
+def create_subtitle_clips(video, subs, font_english, font_arabic, renderer=None, verse_segments=None,
+                          shaping_backend=SHAPING_BACKEND):
+    """Generate subtitle clips with proper compositing"""
+    return [cue.to_clip() for cue in create_subtitle_cues(video, subs, font_english, font_arabic, renderer,
+                                                          verse_segments, shaping_backend)]
 
 
-def create_header_clips_updated(video, surah_no, font_english, font_arabic):
-    """Generate header clips using the new RTL animation approach"""
-    header_clips = []
+def create_header_cues(video, surah_no, font_english, font_arabic, renderer=None):
+    """Generate positioned header cues using the RTL animation approach"""
+    header_cues = []
 
     with open(CHAPTERS_PATH, 'r', encoding='utf-8') as f:
         data = json.load(f)
@@ -428,117 +399,285 @@ def create_header_clips_updated(video, surah_no, font_english, font_arabic):
     surah_meaning_en = data_en["translatedName"]
 
     # Arabic header
-    arabic_clip, canvas_width, height_ar = create_slide_animation(
+    arabic_cue, canvas_width, height_ar = create_slide_animation(
         text=surah_name_ar,
         font_path=FONT_ARABIC_HEADER_PATH,
         font_size=FONT_HEADER_SIZE_ARABIC,
         duration=video.duration,
         bg_color=(0, 0, 0, 0),
         is_rtl=True,
-        h_pad=70)
+        h_pad=70,
+        renderer=renderer)
 
     base_y = 136
     # Get dimensions for positioning
     # _, width_ar, height_ar = preprocess_subtitle(surah_name_ar, font_arabic, is_arabic=True)
-    header_clips.append(arabic_clip.with_position(((video.w - canvas_width) / 2, base_y)))
+    header_cues.append(arabic_cue.place((video.w - canvas_width) / 2, base_y))
     base_y += height_ar + 20
 
     # English header (using same approach but left-to-right)
-    english_clip, canvas_width, height_en = create_slide_animation(
+    english_cue, canvas_width, height_en = create_slide_animation(
         text=surah_name_en,
         font_path=FONT_ENGLISH_HEADER_PATH,
         font_size=FONT_HEADER_SIZE,
         duration=video.duration,
         bg_color=(0, 0, 0, 0),
         is_rtl=False,
-        h_pad=40)
+        h_pad=40,
+        renderer=renderer)
 
     # _, width_en, height_en = preprocess_subtitle(surah_name_en, font_english, is_arabic=False)
-    header_clips.append(english_clip.with_position(((video.w - canvas_width) / 2, base_y)))
+    header_cues.append(english_cue.place((video.w - canvas_width) / 2, base_y))
     base_y += height_en + 20
 
     # English meaning (using same approach but left-to-right)
-    english_meaning_clip, canvas_width, canvas_height = create_slide_animation(
+    english_meaning_cue, canvas_width, canvas_height = create_slide_animation(
         text=surah_meaning_en,
         font_path=FONT_ENGLISH_HEADER_PATH,
         font_size=FONT_HEADER_MEANING_SIZE,
         duration=video.duration,
         bg_color=(0, 0, 0, 0),
         is_rtl=False,
-        h_pad=40)
+        h_pad=40,
+        renderer=renderer)
 
     # _, width_en, height_en = preprocess_subtitle(surah_name_en, font_english, is_arabic=False)
-    header_clips.append(english_meaning_clip.with_position(((video.w - canvas_width) / 2, base_y)))
+    header_cues.append(english_meaning_cue.place((video.w - canvas_width) / 2, base_y))
 
-    return header_clips
+    return header_cues
+
+
+def create_header_clips_updated(video, surah_no, font_english, font_arabic, renderer=None):
+    """Generate header clips using the new RTL animation approach"""
+    return [cue.to_clip() for cue in create_header_cues(video, surah_no, font_english, font_arabic, renderer)]
 
 
 # --- MAIN EXECUTION ---
-def main(surah_number):
+def main(surah_number, shaping_backend=SHAPING_BACKEND, text_renderer=TEXT_RENDERER,
+         highlight_words=HIGHLIGHT_WORDS, profile=PROFILE_RENDER, engine=RENDER_ENGINE,
+         background_path=BASE_INIT_VIDEO_PATH, overlay_format=OVERLAY_FORMAT, pix_fmt=PIXEL_FORMAT,
+         prebake_header=BAKE_HEADER, workers=RENDER_WORKERS, vfr=VFR_RENDER, base_fps=VFR_BASE_FPS,
+         segments=RENDER_SEGMENTS, cache_background=CACHE_BACKGROUND, io_backend=IO_BACKEND,
+         variants=OUTPUT_VARIANTS, verse_keyframes=VERSE_KEYFRAMES):
     # Update file paths with the dynamic surah number
     JSON_PATH = BASE_JSON_PATH.format(surah_number)
     AUDIO_PATH = BASE_AUDIO_PATH.format(surah_number)
-    INIT_VIDEO_PATH = BASE_INIT_VIDEO_PATH.format(surah_number)
-    TEMP_MERGED_PATH = BASE_TEMP_MERGED_PATH.format(surah_number)
+    INIT_VIDEO_PATH = background_path.format(surah_number)
     SUBS_PATH = BASE_SUBS_PATH.format(surah_number)
     OUTPUT_VIDEO_PATH = BASE_OUTPUT_VIDEO_PATH.format(surah_number)
+    OVERLAY_VIDEO_PATH = overlay_path(BASE_OVERLAY_VIDEO_PATH.format(surah_number), overlay_format)
+    HEADER_INTRO_PATH = BASE_HEADER_INTRO_PATH.format(surah_number)
+    HEADER_LOOP_PATH = BASE_HEADER_LOOP_PATH.format(surah_number)
+    vfr = vfr and engine == "numpy"
+    segments = segments if engine == "numpy" and not vfr else 1
+    prebake_header = prebake_header and engine == "numpy" and not vfr and segments <= 1
+    if prebake_header and (cache_background or io_backend != "ffmpeg"):
+        # The baked header's intro is spliced in by ffmpeg's BackgroundReader (see background_cache.open_background)
+        raise ValueError("--bake-header cannot be combined with --cache-background or --io-backend pyav")
+    if variants and engine != "numpy":
+        raise ValueError("--variants needs --engine numpy")
+    if variants:
+        # Variants share one ffmpeg decode in this process; these options need their own reader or process layout
+        unsupported = [flag for flag, selected in (("--workers", workers > 1), ("--segments", segments > 1),
+                                                   ("--vfr", vfr), ("--bake-header", prebake_header),
+                                                   ("--cache-background", cache_background),
+                                                   ("--io-backend pyav", io_backend != "ffmpeg"),
+                                                   ("--profile", profile))
+                       if selected]
+        if unsupported:
+            raise ValueError(f"--variants cannot be combined with {', '.join(unsupported)}")
 
     try:
         # Step 1: Download MP3 file from JSON
         print("Step 1: Downloading MP3 file...")
         if not os.path.exists(AUDIO_PATH) and not download_audio(JSON_PATH, AUDIO_PATH):
             return
+        # Transcoded to AAC once per surah and reciter, every render muxes it with -c:a copy
+        AUDIO_TRACK_PATH = cached_audio(AUDIO_PATH, JSON_PATH)
 
-        # Step 2: Merge Canva video and audio using ffmpeg-python
-        if not os.path.exists(TEMP_MERGED_PATH):
-            # Step 2: Merge Canva video and audio using ffmpeg-python
-            print("Step 1: Merging video and audio...")
-
-            (
-                ffmpeg
-                .input(INIT_VIDEO_PATH, stream_loop=-1)  # Loop video indefinitely
-                .video
-                .output(
-                    ffmpeg.input(AUDIO_PATH).audio,
-                    TEMP_MERGED_PATH,
-                    vcodec="libx264",  # Video codec
-                    acodec="aac",  # Audio codec
-                    audio_bitrate="192k",  # Set audio bitrate to 192kbps
-                    pix_fmt="yuv420p",  # Pixel format (for compatibility)
-                    shortest=None,  # End when shortest stream ends
-                    map_metadata="-1",  # Strip metadata
-                    #**{'map': ['0:v:0', '1:a:0']}  # Explicit stream mapping (video from 1st input, audio from 2nd)
-                )
-                .run(overwrite_output=True)
-            )
-
-            print("Video and audio merged successfully.")
-
-        # Step 3: Generate SRT subtitles
+        # Step 2: Generate SRT subtitles
         if not os.path.exists(SUBS_PATH):
             print("Step 2: Generating SRT subtitles...")
             json_to_srt(JSON_PATH, SUBS_PATH)
             print("SRT subtitles generated successfully.")
 
-        # Step 4: Add subtitles to the merged video
-        print("Step 4: Adding subtitles to the video...")
+        if engine == "overlay" and os.path.exists(OVERLAY_VIDEO_PATH):
+            # The text layers of this surah were already rendered, only the ffmpeg overlay pass runs
+            print(f"Step 3: Overlaying {OVERLAY_VIDEO_PATH} onto {INIT_VIDEO_PATH}...")
+            background = probe_video(INIT_VIDEO_PATH)
+            keyframes = keyframe_times(JSON_PATH, background.fps) if verse_keyframes else None
+            apply_overlay(INIT_VIDEO_PATH, OVERLAY_VIDEO_PATH, AUDIO_TRACK_PATH, OUTPUT_VIDEO_PATH,
+                          size=background.size,
+                          fps=background.fps,
+                          duration=probe_duration(AUDIO_TRACK_PATH),
+                          video_args=encoder_args(keyframes=keyframes),
+                          audio_output_args=audio_args("copy"),
+                          overlay_format=overlay_format)
+            print(f"Final video created at {OUTPUT_VIDEO_PATH}")
+            return
+
+        # Step 3: Add subtitles over the looped background; the MP3 is an input of the final encode,
+        # so nothing is encoded twice
+        print("Step 3: Adding subtitles to the video...")
         font_english, font_arabic, font_english_header, font_arabic_header = setup_environment()
-        video = VideoFileClip(TEMP_MERGED_PATH)
+        audio_duration = probe_duration(AUDIO_TRACK_PATH)
+        if engine == "moviepy":
+            video = VideoFileClip(INIT_VIDEO_PATH, audio=False).with_effects([vfx.Loop(duration=audio_duration)])
+        else:
+            # The other engines decode the background themselves, so only its size and fps are probed
+            background = probe_video(INIT_VIDEO_PATH)
+            video = VideoInfo(background.size, background.fps, audio_duration)
         subs = pysrt.open(SUBS_PATH)
+        keyframes = keyframe_times(JSON_PATH, video.fps) if verse_keyframes else None
+
+        renderer = get_renderer(text_renderer, shaping_backend)
+        verse_segments = load_verse_segments(JSON_PATH) if highlight_words else None
+
+        if variants:
+            # One background decode feeds every variant, variants of the same width share their sprites
+            renderer = CachedRenderer(renderer)
+            outputs = []
+            for name in variants:
+                variant = VIDEO_VARIANTS[name]
+                variant_video = VideoInfo(variant.size, video.fps, video.duration)
+                cues = create_header_cues(variant_video, surah_number, font_english_header, font_arabic_header,
+                                          renderer)
+                cues += create_subtitle_cues(variant_video, load_subs(JSON_PATH, variant.translation), font_english,
+                                             font_arabic, renderer, verse_segments, shaping_backend)
+                outputs.append((BASE_VARIANT_OUTPUT_PATH.format(surah_number, name), variant.size, cues))
+            render_variants(INIT_VIDEO_PATH, outputs,
+                            fps=video.fps,
+                            duration=video.duration,
+                            audio_path=AUDIO_TRACK_PATH,
+                            video_args=encoder_args(keyframes=keyframes),
+                            audio_output_args=audio_args("copy"),
+                            pix_fmt=pix_fmt)
+            print(f"Final videos created at {', '.join(path for path, _, _ in outputs)}")
+            return
 
-        header_clips = create_header_clips_updated(video, surah_number, font_english_header, font_arabic_header)
-
-        subtitle_clips = create_subtitle_clips(video, subs, font_english, font_arabic)
-        final = CompositeVideoClip([video] + header_clips + subtitle_clips)
-        # final = CompositeVideoClip([video] + header_clips)
-        final.write_videofile(
-            OUTPUT_VIDEO_PATH,
-            fps=video.fps,
-            codec="libx264",
-            audio_codec="aac",
-            threads=32,
-            preset="medium"
-        )
+        header_cues = create_header_cues(video, surah_number, font_english_header, font_arabic_header, renderer)
+        subtitle_cues = create_subtitle_cues(video, subs, font_english, font_arabic, renderer, verse_segments,
+                                             shaping_backend)
+        profiler = RenderProfiler() if profile else None
+
+        if engine in ("ffmpeg", "overlay") and profiler:
+            print(f"Profiling is not available for the {engine} engine")
+            profiler = None
+
+        if engine == "overlay":
+            render_overlay(header_cues + subtitle_cues, OVERLAY_VIDEO_PATH, video.size, video.fps, video.duration,
+                           overlay_format=overlay_format)
+            apply_overlay(INIT_VIDEO_PATH, OVERLAY_VIDEO_PATH, AUDIO_TRACK_PATH, OUTPUT_VIDEO_PATH,
+                          size=video.size,
+                          fps=video.fps,
+                          duration=video.duration,
+                          video_args=encoder_args(keyframes=keyframes),
+                          audio_output_args=audio_args("copy"),
+                          overlay_format=overlay_format)
+        elif engine == "ffmpeg":
+            render_filtergraph(INIT_VIDEO_PATH, AUDIO_TRACK_PATH, header_cues + subtitle_cues, OUTPUT_VIDEO_PATH,
+                               size=video.size,
+                               fps=video.fps,
+                               duration=video.duration,
+                               video_args=encoder_args(keyframes=keyframes),
+                               audio_output_args=audio_args("copy"))
+        elif engine == "numpy":
+            cues = header_cues + subtitle_cues
+            background_args = dict(background_path=INIT_VIDEO_PATH, audio_path=AUDIO_TRACK_PATH, loop_background=True)
+            if prebake_header:
+                # Only the subtitles are composited per frame, the header is already in the background
+                intro_seconds = bake_header(INIT_VIDEO_PATH, header_cues, HEADER_INTRO_PATH, HEADER_LOOP_PATH,
+                                            video.size, video.fps, pix_fmt=pix_fmt)
+                cues = subtitle_cues
+                background_args = dict(background_path=HEADER_LOOP_PATH, audio_path=AUDIO_TRACK_PATH,
+                                       loop_background=True, intro_path=HEADER_INTRO_PATH if intro_seconds else None,
+                                       intro_seconds=intro_seconds)
+                header_cues = []
+            if vfr:
+                if profiler:
+                    print("Profiling is not available in VFR mode")
+                    profiler = None
+                # The background may be a still image: it is read directly, not through the merged video.
+                # Only changed frames are encoded, with their own timestamps, through the PyAV writer
+                render_cues_vfr(INIT_VIDEO_PATH, cues, OUTPUT_VIDEO_PATH,
+                                size=video.size,
+                                fps=video.fps,
+                                duration=video.duration,
+                                audio_path=AUDIO_TRACK_PATH,
+                                base_fps=base_fps,
+                                cache_background=cache_background,
+                                video_args=vfr_video_args(video.fps, keyframes=keyframes),
+                                audio_output_args=audio_args("copy"),
+                                pix_fmt=pix_fmt)
+            elif segments > 1:
+                if profiler:
+                    print("Profiling is not available with several segments")
+                    profiler = None
+                # Cut at verse boundaries so no subtitle reveal straddles two segments
+                render_segments(INIT_VIDEO_PATH, cues, AUDIO_TRACK_PATH, OUTPUT_VIDEO_PATH,
+                                size=video.size,
+                                fps=video.fps,
+                                duration=video.duration,
+                                boundaries=[cue.start for cue in subtitle_cues],
+                                segments=segments,
+                                keyframes=keyframes,
+                                cache_background=cache_background,
+                                io_backend=io_backend,
+                                audio_output_args=audio_args("copy"),
+                                pix_fmt=pix_fmt)
+            elif workers > 1:
+                if profiler:
+                    print("Profiling is not available with several workers")
+                    profiler = None
+                render_cues_parallel(cues=cues, output_path=OUTPUT_VIDEO_PATH,
+                                     size=video.size,
+                                     fps=video.fps,
+                                     duration=video.duration,
+                                     video_args=encoder_args(keyframes=keyframes),
+                                     audio_output_args=audio_args("copy"),
+                                     pix_fmt=pix_fmt,
+                                     workers=workers,
+                                     cache_background=cache_background,
+                                     io_backend=io_backend,
+                                     **background_args)
+            else:
+                if profiler:
+                    profiler.instrument_cues({"header": header_cues, "subtitle": subtitle_cues})
+                with profiler.session() if profiler else contextlib.nullcontext():
+                    render_cues(cues=cues, output_path=OUTPUT_VIDEO_PATH,
+                                size=video.size,
+                                fps=video.fps,
+                                duration=video.duration,
+                                video_args=encoder_args(keyframes=keyframes),
+                                audio_output_args=audio_args("copy"),
+                                profiler=profiler,
+                                pix_fmt=pix_fmt,
+                                cache_background=cache_background,
+                                io_backend=io_backend,
+                                **background_args)
+        else:
+            header_clips = [cue.to_clip() for cue in header_cues]
+            subtitle_clips = [cue.to_clip() for cue in subtitle_cues]
+            # Cue frames carry their own alpha, so the background is used as-is and no mask composite is built
+            final = IndexedCompositeVideoClip([video] + header_clips + subtitle_clips, use_bgclip=True)
+            # final = CompositeVideoClip([video] + header_clips)
+            if profiler:
+                profiler.instrument(final, {"background": [video], "header": header_clips,
+                                            "subtitle": subtitle_clips})
+
+            write_kwargs = moviepy_write_kwargs()
+            write_kwargs["ffmpeg_params"] = (write_kwargs["ffmpeg_params"] or []) + keyframe_args(keyframes)
+            with profiler.session() if profiler else contextlib.nullcontext():
+                final.write_videofile(
+                    OUTPUT_VIDEO_PATH,
+                    fps=video.fps,
+                    codec="libx264",
+                    audio=AUDIO_TRACK_PATH,  # Muxed as is (-acodec copy), moviepy never decodes it
+                    **write_kwargs
+                )
+        if profiler:
+            profiler.write_report(BASE_PROFILE_REPORT_PATH.format(surah_number),
+                                  BASE_PROFILE_TRACE_PATH.format(surah_number))
         print(f"Final video created at {OUTPUT_VIDEO_PATH}")
 
     except Exception as e:
@@ -547,18 +686,59 @@ def main(surah_number):
         # Clean up temporary files
         if os.path.exists(TEMP_DIR):
             shutil.rmtree(TEMP_DIR)
-        if os.path.exists(TEMP_MERGED_PATH):
-            os.remove(TEMP_MERGED_PATH)
         if os.path.exists(SUBS_PATH):
             os.remove(SUBS_PATH)
+        for baked_path in (HEADER_INTRO_PATH, HEADER_LOOP_PATH):
+            if os.path.exists(baked_path):
+                os.remove(baked_path)
 
 
 if __name__ == "__main__":
-    # # Setup argparse
-    # parser = argparse.ArgumentParser(description="Generate a subtitled video from a JSON file and audio.")
-    # parser.add_argument("surah_number", type=int, help="The number of the surah (e.g., 113)")
-    # args = parser.parse_args()
-    # surah_number = args.surah_number
+    # Setup argparse
+    parser = argparse.ArgumentParser(description="Generate a subtitled video from a JSON file and audio.")
+    parser.add_argument("surah_number", type=int, nargs="?", default=101,
+                        help="The number of the surah (e.g., 113)")
+    parser.add_argument("--shaping", choices=SHAPING_BACKENDS, default=SHAPING_BACKEND,
+                        help="Text shaping backend for Arabic")
+    parser.add_argument("--renderer", choices=TEXT_RENDERERS, default=TEXT_RENDERER,
+                        help="Text renderer for headers and subtitles")
+    parser.add_argument("--highlight-words", action="store_true", default=HIGHLIGHT_WORDS,
+                        help="Highlight the word being recited in the Arabic subtitle")
+    parser.add_argument("--profile", action="store_true", default=PROFILE_RENDER,
+                        help="Write a per-layer frame cost report and flamegraph trace")
+    parser.add_argument("--engine", choices=RENDER_ENGINES, default=RENDER_ENGINE,
+                        help="Compositing engine: in-place numpy blending between ffmpeg pipes, an ffmpeg overlay "
+                             "filtergraph, a reusable alpha overlay video, or moviepy")
+    parser.add_argument("--background", default=BASE_INIT_VIDEO_PATH,
+                        help="Background loop video ({} is replaced by the surah number)")
+    parser.add_argument("--overlay-format", choices=sorted(OVERLAY_FORMATS), default=OVERLAY_FORMAT,
+                        help="Alpha codec of the text layer video rendered by the overlay engine")
+    parser.add_argument("--pix-fmt", choices=PIXEL_FORMATS, default=PIXEL_FORMAT,
+                        help="Pixel format the numpy engine composites in (yuv420p skips the RGB round trip)")
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS,
+                        help="Numpy engine: number of compositing processes")
+    parser.add_argument("--cache-background", action="store_true", default=CACHE_BACKGROUND,
+                        help="Numpy engine: read the background loop from a decoded raw frame cache")
+    parser.add_argument("--io-backend", choices=IO_BACKENDS, default=IO_BACKEND,
+                        help="Numpy engine: decode and encode through ffmpeg pipes or in process with PyAV")
+    parser.add_argument("--verse-keyframes", action=argparse.BooleanOptionalAction, default=VERSE_KEYFRAMES,
+                        help="Force a keyframe at the start of every verse (for stream-copy clips)")
+    parser.add_argument("--variants", nargs="+", choices=sorted(VIDEO_VARIANTS), default=OUTPUT_VARIANTS,
+                        help="Numpy engine: render these sizes / translations together from one background decode")
+    parser.add_argument("--segments", type=int, default=RENDER_SEGMENTS,
+                        help="Numpy engine: render this many verse-aligned segments in parallel")
+    parser.add_argument("--vfr", action="store_true", default=VFR_RENDER,
+                        help="Numpy engine: variable frame rate, frames only where the picture changes")
+    parser.add_argument("--base-fps", type=float, default=VFR_BASE_FPS,
+                        help="Background frame rate in --vfr mode")
+    parser.add_argument("--bake-header", action="store_true", default=BAKE_HEADER,
+                        help="Numpy engine: pre-composite the settled header into the background loop")
+    args = parser.parse_args()
     # for surah_number in range(101, 115):
     #     main(surah_number)
-    main(101)
+    main(args.surah_number, shaping_backend=args.shaping, text_renderer=args.renderer,
+         highlight_words=args.highlight_words, profile=args.profile, engine=args.engine,
+         background_path=args.background, overlay_format=args.overlay_format, pix_fmt=args.pix_fmt,
+         prebake_header=args.bake_header, workers=args.workers, vfr=args.vfr, base_fps=args.base_fps,
+         segments=args.segments, cache_background=args.cache_background, io_backend=args.io_backend,
+         variants=args.variants, verse_keyframes=args.verse_keyframes)
@@ -0,0 +1,200 @@
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+from moviepy.video.io import ffmpeg_writer
+
+# --- CONFIGURATION ---
+TOP_CUES = 30  # Cues listed individually in the report
+TRACE_ALLOCATIONS = True  # tracemalloc peak per call; slows allocation-heavy Python code, so times read a bit high
+
+
+class _Stat:
+    __slots__ = ("calls", "total", "self_time", "alloc")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.self_time = 0.0
+        self.alloc = 0
+
+
+class RenderProfiler:
+    """Opt-in per-layer frame cost profiler for composited renders
+
+    Wraps each layer's frame function (background decode, header and
+    subtitle cues), the compositor and the encoder's write_frame. Every call
+    is recorded under its call path with cumulative and self time, call
+    count and the memory it allocated: the tracemalloc peak above the
+    level at entry, children included (numpy buffers are traced too). The
+    compositor's self time is the blending cost.
+    ``write_report`` writes a sorted text report and a
+    folded-stack trace for flamegraph.pl / speedscope.
+    """
+
+    def __init__(self):
+        self.stats = defaultdict(_Stat)
+        self._stack = []  # [name, start, child_time, traced memory at entry, peak traced memory]
+        self._cue_layers = {}  # id(cue) -> (layer, cue name), from instrument_cues
+        self.wall_start = None
+        self.wall_seconds = 0.0
+
+    def wrap(self, func, *names):
+        """Wrap a callable so each call is recorded under the current path plus ``names``"""
+        def profiled(*args, **kwargs):
+            for name in names:
+                self._enter(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                for _ in names:
+                    self._exit()
+
+        return profiled
+
+    def _enter(self, name):
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            # The peak is reset for the child, so keep the parent's peak so far on its entry
+            self._stack[-1][4] = max(self._stack[-1][4], peak)
+        tracemalloc.reset_peak()
+        self._stack.append([name, time.perf_counter(), 0.0, current, current])
+
+    def _exit(self):
+        name, start, child_time, memory_start, peak = self._stack[-1]
+        elapsed = time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        stat = self.stats[tuple(entry[0] for entry in self._stack)]
+        stat.calls += 1
+        stat.total += elapsed
+        stat.self_time += elapsed - child_time
+        stat.alloc += peak - memory_start
+        self._stack.pop()
+        if self._stack:
+            self._stack[-1][2] += elapsed
+            self._stack[-1][4] = max(self._stack[-1][4], peak)
+
+    def wrap_clip(self, clip, layer, cue=None):
+        """Profile a moviepy clip's frame function as ``layer`` (and ``cue`` below it)"""
+        names = (layer,) if cue is None else (layer, cue)
+        clip.frame_function = self.wrap(clip.frame_function, *names)
+        return clip
+
+    def instrument(self, final, layers):
+        """Wrap the compositor and every clip of ``layers`` ({layer name: [clips]})"""
+        for layer, clips in layers.items():
+            for idx, clip in enumerate(clips):
+                cue = None if len(clips) == 1 else getattr(clip, "cue_name", None) or f"#{idx}"
+                self.wrap_clip(clip, layer, cue)
+        final.frame_function = self.wrap(final.frame_function, "compositor")
+        return final
+
+    def instrument_cues(self, layers):
+        """Wrap Cue.blend_onto of every cue of ``layers`` ({layer name: [cues]}) for the frame compositor
+
+        Cues the compositor never blends one by one (flattened into a
+        StaticOverlay, or converted to YuvCue) are picked up by
+        instrument_compositor, which uses the layers recorded here.
+        """
+        for layer, cues in layers.items():
+            for idx, cue in enumerate(cues):
+                name = cue.name or f"#{idx}"
+                self._cue_layers[id(cue)] = (layer, name)
+                cue.blend_onto = self.wrap(cue.blend_onto, layer, name)
+
+    def _overlay_layer(self, cues):
+        """Layer name of a StaticOverlay: its cues' layer, or every layer it flattens, joined by +"""
+        layers = []
+        for cue in cues:
+            layer = self._cue_layers.get(id(cue), ("other",))[0]
+            if layer not in layers:
+                layers.append(layer)
+        return "+".join(layers)
+
+    def instrument_compositor(self, compositor):
+        """Attribute the cues a compositor blends without Cue.blend_onto to their layers
+
+        Overlay rebuilds and the per-frame StaticOverlay blend are recorded
+        under the layer of the cues flattened into the overlay; YuvCue blends
+        under their cue, like instrument_cues.
+        """
+        if hasattr(compositor, "build_overlay"):
+            build_overlay = compositor.build_overlay
+
+            def build(cues, t):
+                layer = self._overlay_layer(cues)
+                self.wrap(build_overlay, layer, "overlay rebuild")(cues, t)
+                if compositor.overlay is not None:
+                    compositor.overlay.blend_onto = self.wrap(compositor.overlay.blend_onto, layer, "static overlay")
+
+            compositor.build_overlay = build
+        else:
+            for idx, yuv_cue in enumerate(compositor.cues):
+                layer, name = self._cue_layers.get(id(yuv_cue.cue), ("other", f"#{idx}"))
+                yuv_cue.blend_onto = self.wrap(yuv_cue.blend_onto, layer, name)
+
+    @contextmanager
+    def session(self):
+        """Time the whole render and the encoder boundary (frames written to the ffmpeg pipe)"""
+        original = ffmpeg_writer.FFMPEG_VideoWriter.write_frame
+        ffmpeg_writer.FFMPEG_VideoWriter.write_frame = self.wrap(original, "encoder")
+        tracing = TRACE_ALLOCATIONS and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        self.wall_start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.wall_seconds = time.perf_counter() - self.wall_start
+            if tracing:
+                tracemalloc.stop()
+            ffmpeg_writer.FFMPEG_VideoWriter.write_frame = original
+
+    def _by_position(self, position):
+        """Aggregate stats by the path element at ``position`` (e.g. 1 = layer below the compositor)"""
+        totals = defaultdict(_Stat)
+        for path, stat in self.stats.items():
+            if len(path) <= position:
+                continue
+            key = path[:position + 1]
+            total = totals[key]
+            if len(path) == position + 1:
+                total.calls += stat.calls
+                total.total += stat.total
+                total.self_time += stat.self_time
+                total.alloc += stat.alloc  # Peaks already include the subtree
+        return totals
+
+    @staticmethod
+    def _format_rows(title, rows):
+        lines = [title, f"{'name':<48}{'calls':>9}{'total s':>11}{'self s':>11}{'ms/call':>10}{'MB alloc':>10}"]
+        for key, stat in rows:
+            per_call = stat.total / stat.calls * 1000 if stat.calls else 0.0
+            lines.append(f"{' / '.join(key)[:47]:<48}{stat.calls:>9}{stat.total:>11.2f}{stat.self_time:>11.2f}"
+                         f"{per_call:>10.2f}{stat.alloc / 1e6:>10.1f}")
+        return lines
+
+    def report(self):
+        """Sorted text report: top level (compositor, encoder), layers, then the most expensive cues"""
+        lines = [f"Render wall time: {self.wall_seconds:.2f}s", ""]
+        top = sorted(self._by_position(0).items(), key=lambda item: -item[1].total)
+        lines += self._format_rows("Top level", top) + [""]
+        layers = sorted(self._by_position(1).items(), key=lambda item: -item[1].total)
+        lines += self._format_rows("By layer", layers) + [""]
+        cues = sorted(((path, stat) for path, stat in self.stats.items() if len(path) == 3),
+                      key=lambda item: -item[1].total)
+        lines += self._format_rows(f"Top {TOP_CUES} cues", cues[:TOP_CUES])
+        return "\n".join(lines)
+
+    def folded(self):
+        """Folded stacks ("a;b;c microseconds") of self time, for flamegraph tools"""
+        return "\n".join(f"{';'.join(name.replace(';', ',') for name in path)} {int(stat.self_time * 1e6)}"
+                         for path, stat in sorted(self.stats.items()) if stat.self_time > 0)
+
+    def write_report(self, report_path, folded_path):
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(self.report() + "\n")
+        with open(folded_path, "w", encoding="utf-8") as f:
+            f.write(self.folded() + "\n")
+        print(f"Profile written to {report_path} (flamegraph trace: {folded_path})")
@@ -0,0 +1,110 @@
+import bisect
+import copy
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+
+from moviepy.config import FFMPEG_BINARY
+
+from background_cache import BackgroundCache
+from ffmpeg_io import audio_args, encoder_args, probe_duration
+from frame_compositor import render_cues
+
+# --- CONFIGURATION ---
+SEGMENT_DIR = "data/temp_segments"
+
+
+def split_at_boundaries(boundaries, duration, segments, fps):
+    """(start, end) ranges of about duration / segments seconds, each cut at the boundary nearest its target
+
+    Cuts are snapped to whole frames so the segments join without gaps.
+    """
+    boundaries = sorted(round(b * fps) / fps for b in boundaries if 0 < b < duration)
+    cuts = []
+    for idx in range(1, segments):
+        target = duration * idx / segments
+        pos = bisect.bisect_left(boundaries, target)
+        nearest = min(boundaries[max(pos - 1, 0):pos + 1], key=lambda b: abs(b - target), default=None)
+        if nearest is not None and (not cuts or nearest > cuts[-1]):
+            cuts.append(nearest)
+    edges = [0.0] + cuts + [duration]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def segment_cues(cues, start, end):
+    """Copies of the cues playing in [start, end), with times relative to start"""
+    shifted = []
+    for cue in cues:
+        if cue.start < end and cue.end > start:
+            cue = copy.copy(cue)
+            cue.start -= start
+            shifted.append(cue)
+    return shifted
+
+
+def _render_segment(background_path, cues, path, size, fps, start, end, period, video_args, pix_fmt,
+                    cache_background, io_backend):
+    # Segment boundaries are on the frame grid, so the background loop offset matches a serial render
+    render_cues(background_path, segment_cues(cues, start, end), path, size, fps, end - start,
+                loop_background=True, background_start=start % period if period else 0.0,
+                video_args=video_args, pix_fmt=pix_fmt, cache_background=cache_background,
+                io_backend=io_backend)
+
+
+def render_segments(background_path, cues, audio_path, output_path, size, fps, duration, boundaries,
+                    segments=None, preset=None, audio_output_args=None, pix_fmt="rgb24", segment_dir=SEGMENT_DIR,
+                    cache_background=False, io_backend="ffmpeg", keyframes=None):
+    """Render the timeline as independent segments in parallel processes, then join them without re-encoding
+
+    The timeline is cut at the verse boundaries nearest to even splits.
+    Each segment is rendered video-only by its own forked process (cues
+    shifted to the segment, background loop seeked to the same phase), the
+    segments are joined with the concat demuxer and -c copy, and the audio
+    is muxed once at the end. x264 threads are divided between segments.
+    ``keyframes`` (output times in seconds) are shifted into each segment.
+    Returns the wall-clock seconds.
+    """
+    segments = segments or os.cpu_count()
+    ranges = split_at_boundaries(boundaries, duration, segments, fps)
+    period = probe_duration(background_path)
+    threads = max(os.cpu_count() // len(ranges), 1)
+    context = multiprocessing.get_context("fork")
+    if cache_background:
+        # Decoded once here, every segment process then maps the same file
+        BackgroundCache(background_path, size, fps, pix_fmt)
+
+    os.makedirs(segment_dir, exist_ok=True)
+    started = time.perf_counter()
+    try:
+        paths = [os.path.abspath(os.path.join(segment_dir, f"segment_{idx:03d}.mp4")) for idx in range(len(ranges))]
+        video_args = [encoder_args(preset=preset, threads=threads,
+                                   keyframes=[t - start for t in keyframes or [] if start <= t < end])
+                      for start, end in ranges]
+        processes = [context.Process(target=_render_segment, args=(background_path, cues, path, size, fps, start,
+                                                                   end, period, segment_args, pix_fmt,
+                                                                   cache_background, io_backend))
+                     for path, (start, end), segment_args in zip(paths, ranges, video_args)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        failed = [idx for idx, process in enumerate(processes) if process.exitcode != 0]
+        if failed:
+            raise RuntimeError(f"Segments {failed} failed to render")
+
+        concat_path = os.path.join(segment_dir, "segments.ffconcat")
+        with open(concat_path, "w", encoding="utf-8") as f:
+            f.write("ffconcat version 1.0\n")
+            f.writelines(f"file '{path}'\n" for path in paths)
+        subprocess.run([FFMPEG_BINARY, "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", concat_path,
+                        "-i", audio_path, "-map", "0:v:0", "-map", "1:a:0", "-c:v", "copy"]
+                       + (audio_output_args or audio_args()) + ["-shortest", output_path], check=True)
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - started
+    print(f"Rendered {len(ranges)} segments in parallel and joined them in {elapsed:.1f}s "
+          f"({duration * fps / elapsed if elapsed else 0.0:.1f} fps)")
+    return elapsed
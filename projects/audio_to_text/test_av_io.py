@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("av")
+
+from av_io import AvFrameWriter
+from ffmpeg_io import encoder_args, probe_keyframes
+
+SIZE = (64, 48)
+FPS = 10
+
+
+def test_forced_keyframes(tmp_path):
+    output_path = str(tmp_path / "keyframes.mp4")
+    video_args = encoder_args(preset="ultrafast", threads=1, crf=23, keyframes=[1.25, 2.0])
+    writer = AvFrameWriter(output_path, SIZE, FPS, video_args=video_args)
+    frame = np.zeros((SIZE[1], SIZE[0], 3), dtype=np.uint8)
+    for idx in range(3 * FPS):
+        frame[:] = idx * 8
+        writer.write(frame)
+    writer.close()
+
+    # The first frame at or after each time, as with -force_key_frames
+    assert probe_keyframes(output_path) == pytest.approx([0.0, 1.3, 2.0])
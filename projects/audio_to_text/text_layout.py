@@ -0,0 +1,181 @@
+import unicodedata
+from bisect import bisect_right
+from functools import lru_cache
+
+import arabic_reshaper
+from bidi.algorithm import get_display
+from PIL import ImageFont, features
+
+# --- CONFIGURATION ---
+FALLBACK_FONT_PATH = "fonts/DejaVuSans.ttf"
+LINE_GAP = 10  # Extra pixels between wrapped lines
+
+# Shaping backends: "reshaper" = arabic_reshaper + python-bidi drawn with PIL's basic layout,
+# "raqm" = PIL's RAQM layout (HarfBuzz shaping + FriBiDi reordering) fed with logical text
+SHAPING_BACKENDS = ("reshaper", "raqm")
+DEFAULT_SHAPING_BACKEND = "reshaper"
+
+RESHAPER_CONFIGURATION = {
+    'delete_harakat': False,
+    'support_ligatures': True,
+    'RIAL SIGN': True,
+}
+
+_reshaper = arabic_reshaper.ArabicReshaper(configuration=RESHAPER_CONFIGURATION)
+_advance_cache = {}
+
+
+def check_shaping_backend(backend):
+    """Fail early with a clear message when a shaping backend cannot be used"""
+    if backend not in SHAPING_BACKENDS:
+        raise ValueError(f"Unknown shaping backend '{backend}', expected one of {SHAPING_BACKENDS}")
+    if backend == "raqm" and not features.check_feature("raqm"):
+        raise RuntimeError("Shaping backend 'raqm' needs Pillow built with libraqm")
+
+
+@lru_cache(maxsize=None)
+def load_font(font_path, font_size, backend=DEFAULT_SHAPING_BACKEND):
+    """Load a TrueType font once per (path, size, backend), falling back to DejaVuSans"""
+    check_shaping_backend(backend)
+    layout_engine = ImageFont.Layout.RAQM if backend == "raqm" else ImageFont.Layout.BASIC
+    try:
+        return ImageFont.truetype(font_path, font_size, layout_engine=layout_engine)
+    except IOError:
+        return ImageFont.truetype(FALLBACK_FONT_PATH, font_size, layout_engine=layout_engine)
+
+
+def font_backend(font):
+    """Shaping backend matching the layout engine a font was loaded with"""
+    return "raqm" if font.layout_engine == ImageFont.Layout.RAQM else "reshaper"
+
+
+def split_clusters(text):
+    """Split text into clusters: a base character followed by its combining marks (harakat)"""
+    clusters = []
+    for char in text:
+        if clusters and unicodedata.combining(char):
+            clusters[-1] += char
+        else:
+            clusters.append(char)
+    return clusters
+
+
+def cluster_advance(font, cluster):
+    """Advance width of a single cluster, measured once per font and cached"""
+    key = (font, cluster)
+    advance = _advance_cache.get(key)
+    if advance is None:
+        advance = font.getlength(cluster)
+        _advance_cache[key] = advance
+    return advance
+
+
+class LayoutLine:
+    """One wrapped line: logical text, display text and cluster advance prefix sums"""
+
+    def __init__(self, text, display_text, clusters, prefix):
+        self.text = text
+        self.display_text = display_text
+        self.clusters = clusters
+        self.prefix = prefix
+        self.width = prefix[-1]
+
+    def prefix_width(self, k):
+        """Width in pixels of the first k clusters in reading order (O(1))"""
+        return self.prefix[max(0, min(k, len(self.clusters)))]
+
+
+class TextLayout:
+    """A cue shaped once and wrapped into lines that fit a maximum width"""
+
+    def __init__(self, lines, font, is_rtl, line_pitch, backend=DEFAULT_SHAPING_BACKEND):
+        self.lines = lines
+        self.font = font
+        self.is_rtl = is_rtl
+        self.line_pitch = line_pitch
+        self.backend = backend
+        # Extra keyword arguments for ImageDraw.text / font.getbbox when drawing display_text
+        self.draw_kwargs = {"direction": "rtl" if is_rtl else "ltr"} if backend == "raqm" else {}
+        self.width = max(line.width for line in lines)
+        self.extra_height = (len(lines) - 1) * line_pitch
+
+        # First cluster index of every line, for locating a global cluster count
+        self.line_offsets = [0]
+        for line in lines:
+            self.line_offsets.append(self.line_offsets[-1] + len(line.clusters))
+        self.cluster_count = self.line_offsets[-1]
+
+    def locate(self, k):
+        """Return (line_index, visible width on that line) for the first k clusters"""
+        k = max(0, min(k, self.cluster_count))
+        line_idx = min(bisect_right(self.line_offsets, k) - 1, len(self.lines) - 1)
+        return line_idx, self.lines[line_idx].prefix_width(k - self.line_offsets[line_idx])
+
+
+def shape_text(text, is_rtl, backend=DEFAULT_SHAPING_BACKEND):
+    """Reshape Arabic into presentation forms (logical order is kept); raqm shapes at draw time"""
+    return _reshaper.reshape(text) if is_rtl and backend == "reshaper" else text
+
+
+def to_display(shaped_text, is_rtl, backend=DEFAULT_SHAPING_BACKEND):
+    """Convert shaped logical text into the visual order PIL draws left to right"""
+    # raqm runs FriBiDi itself, reordering here would reverse the line twice
+    return get_display(shaped_text) if is_rtl and backend == "reshaper" else shaped_text
+
+
+def _measure(font, text, is_rtl=False, backend=DEFAULT_SHAPING_BACKEND):
+    clusters = split_clusters(text)
+    prefix = [0.0]
+    if backend == "raqm":
+        # Contextual forms change advances, so measure each cluster-aligned prefix as a whole
+        direction = "rtl" if is_rtl else "ltr"
+        end = 0
+        for cluster in clusters:
+            end += len(cluster)
+            prefix.append(font.getlength(text[:end], direction=direction))
+        return clusters, prefix
+
+    for cluster in clusters:
+        prefix.append(prefix[-1] + cluster_advance(font, cluster))
+    return clusters, prefix
+
+
+def wrap_words(font, shaped_text, max_width, is_rtl=False, backend=DEFAULT_SHAPING_BACKEND):
+    """Greedy word wrap of shaped logical text into lines no wider than max_width"""
+    if max_width is None:
+        return [shaped_text]
+
+    space = cluster_advance(font, " ")
+    lines = []
+    current, current_width = [], 0.0
+    for word in shaped_text.split():
+        if backend == "raqm":
+            word_width = font.getlength(word, direction="rtl" if is_rtl else "ltr")
+        else:
+            word_width = _measure(font, word)[1][-1]
+        needed = word_width if not current else current_width + space + word_width
+        if current and needed > max_width:
+            lines.append(" ".join(current))
+            current, current_width = [word], word_width
+        else:
+            current.append(word)
+            current_width = needed
+    if current:
+        lines.append(" ".join(current))
+    return lines or [""]
+
+
+def layout_text(text, font, is_rtl=False, max_width=None):
+    """Shape a cue once, wrap it to max_width and store per-cluster advance prefix sums
+
+    The shaping backend follows the font's layout engine (see load_font).
+    """
+    backend = font_backend(font)
+    shaped_text = shape_text(text, is_rtl, backend)
+    lines = []
+    for line_text in wrap_words(font, shaped_text, max_width, is_rtl, backend):
+        clusters, prefix = _measure(font, line_text, is_rtl, backend)
+        lines.append(LayoutLine(line_text, to_display(line_text, is_rtl, backend), clusters, prefix))
+
+    ascent, descent = font.getmetrics()
+    return TextLayout(lines, font, is_rtl, ascent + descent + LINE_GAP, backend)
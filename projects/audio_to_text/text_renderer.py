@@ -0,0 +1,270 @@
+import ctypes
+import ctypes.util
+import os
+
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
+
+from text_layout import DEFAULT_SHAPING_BACKEND, layout_text, load_font
+
+# --- CONFIGURATION ---
+FONTS_DIR = "fonts"
+BOX_COLOR = (0, 0, 0, 200)  # Rounded background box behind subtitles
+BOX_RADIUS = 15
+TEXT_RENDERERS = ("pil", "cairo")
+DEFAULT_TEXT_RENDERER = "pil"
+
+
+class Sprite:
+    """A rendered cue image plus how its pixels are laid out in memory
+
+    PIL sprites are straight-alpha RGBA. Cairo sprites are a view straight
+    onto the ARGB32 surface, i.e. premultiplied BGRA on little-endian hosts,
+    kept alive through ``owner``.
+    """
+
+    def __init__(self, pixels, channel_order="RGBA", premultiplied=False, extra_height=0, layout=None, owner=None,
+                 line_positions=None):
+        self.pixels = pixels
+        self.channel_order = channel_order
+        self.premultiplied = premultiplied
+        self.extra_height = extra_height
+        self.layout = layout
+        self.owner = owner
+        self.line_positions = line_positions  # (x, y) each layout line was drawn at, when known
+
+    @property
+    def width(self):
+        return self.pixels.shape[1]
+
+    @property
+    def height(self):
+        return self.pixels.shape[0]
+
+    def channel_views(self):
+        """(r, g, b, a) channel views without copying the pixel buffer"""
+        order = self.channel_order
+        return tuple(self.pixels[..., order.index(c)] for c in "RGBA")
+
+    def to_rgba(self):
+        """Straight-alpha RGBA array for consumers that need it (moviepy); copies unless already RGBA"""
+        if self.channel_order == "RGBA" and not self.premultiplied:
+            return self.pixels
+
+        r, g, b, a = self.channel_views()
+        rgba = np.dstack((r, g, b, a))
+        if self.premultiplied:
+            alpha = a.astype(np.uint16)
+            safe = np.maximum(alpha, 1)
+            rgba[..., :3] = np.minimum((rgba[..., :3].astype(np.uint16) * 255 + safe[..., None] // 2)
+                                       // safe[..., None], 255)
+        return rgba
+
+    def blend_onto(self, frame, x, y, opacity=1.0):
+        """Alpha-blend the sprite into an RGB uint8 frame in place, only inside its bounding box
+
+        Works on the channel views directly, so Cairo's premultiplied BGRA is
+        consumed without first converting the sprite to RGBA.
+        """
+        frame_h, frame_w = frame.shape[:2]
+        x0, y0 = max(int(x), 0), max(int(y), 0)
+        x1, y1 = min(int(x) + self.width, frame_w), min(int(y) + self.height, frame_h)
+        if x0 >= x1 or y0 >= y1 or opacity <= 0:
+            return frame
+
+        sx, sy = x0 - int(x), y0 - int(y)
+        region = (slice(sy, sy + y1 - y0), slice(sx, sx + x1 - x0))
+        r, g, b, a = (channel[region] for channel in self.channel_views())
+
+        scale = int(round(min(opacity, 1.0) * 256))
+        alpha = (a.astype(np.uint16) * scale) >> 8
+        inverse = 255 - alpha
+        target = frame[y0:y1, x0:x1]
+        for idx, channel in enumerate((r, g, b)):
+            src = channel.astype(np.uint16)
+            if self.premultiplied:
+                src = (src * scale) >> 8
+            else:
+                src = (src * alpha + 127) // 255
+            target[..., idx] = np.minimum(src + (target[..., idx] * inverse + 127) // 255, 255)
+        return frame
+
+
+class TextRenderer:
+    """Interface for turning a cue's text into a Sprite"""
+
+    name = None
+
+    def render(self, text, font_path, font_size, is_rtl=False, max_width=None, h_pad=40, is_draw_bg=False,
+               bg_color=(0, 0, 0, 0), fill="white"):
+        raise NotImplementedError
+
+
+class PilTextRenderer(TextRenderer):
+    """Renders with PIL using text_layout for shaping and wrapping"""
+
+    name = "pil"
+
+    def __init__(self, shaping_backend=DEFAULT_SHAPING_BACKEND):
+        self.shaping_backend = shaping_backend
+
+    def render(self, text, font_path, font_size, is_rtl=False, max_width=None, h_pad=40, is_draw_bg=False,
+               bg_color=(0, 0, 0, 0), fill="white"):
+        font = load_font(font_path, font_size, self.shaping_backend)
+        layout = layout_text(text, font, is_rtl=is_rtl, max_width=max_width)
+        display_lines = [line.display_text for line in layout.lines]
+
+        # Calculate dimensions
+        line_boxes = [font.getbbox(line, **layout.draw_kwargs) for line in display_lines]
+        line_widths = [box[2] - box[0] for box in line_boxes]
+        text_width = max(line_widths)
+        text_height = max(box[3] - box[1] for box in line_boxes) + layout.extra_height
+
+        # Create canvas
+        canvas_width = int(text_width + 40)
+        canvas_height = int(text_height + h_pad)
+        img = Image.new("RGBA", (canvas_width, canvas_height), bg_color)
+        draw = ImageDraw.Draw(img)
+
+        # Draw background
+        if is_draw_bg:
+            draw.rounded_rectangle([(0, 0), (canvas_width, canvas_height)], radius=BOX_RADIUS, fill=BOX_COLOR)
+
+        # Position text, one row per wrapped line
+        line_positions = []
+        for line_idx, (display_text, line_width) in enumerate(zip(display_lines, line_widths)):
+            x_pos = canvas_width - line_width - 10 if is_rtl else 10
+            y_pos = 10 + line_idx * layout.line_pitch
+            draw.text((x_pos, y_pos), display_text, font=font, fill=fill, **layout.draw_kwargs)
+            line_positions.append((x_pos, y_pos))
+
+        return Sprite(np.array(img), extra_height=layout.extra_height, layout=layout, line_positions=line_positions)
+
+
+class CairoTextRenderer(TextRenderer):
+    """Renders with Pango/Cairo (HarfBuzz shaping, native bidi and wrapping)
+
+    Fonts are addressed by family name; the files in FONTS_DIR are registered
+    with fontconfig so the bundled Amiri/Noto fonts are found without
+    installing them system-wide.
+    """
+
+    name = "cairo"
+    _fonts_registered = False
+
+    def __init__(self):
+        # Optional dependencies, only needed when this backend is selected
+        import cairocffi
+        import pangocffi
+        import pangocairocffi
+        self.cairo = cairocffi
+        self.pango = pangocffi
+        self.pangocairo = pangocairocffi
+        self._register_fonts()
+
+    @classmethod
+    def _register_fonts(cls):
+        if cls._fonts_registered:
+            return
+        library = ctypes.util.find_library("fontconfig")
+        if library:
+            ctypes.CDLL(library).FcConfigAppFontAddDir(None, os.path.abspath(FONTS_DIR).encode())
+        cls._fonts_registered = True
+
+    def _make_layout(self, ctx, text, font_path, font_size, is_rtl, max_width):
+        pango = self.pango
+        layout = self.pangocairo.create_layout(ctx)
+
+        desc = pango.FontDescription()
+        desc.family = load_font(font_path, font_size).getname()[0]
+        desc.set_absolute_size(pango.units_from_double(font_size))
+        layout.font_description = desc
+        layout.text = text
+        layout.alignment = pango.Alignment.RIGHT if is_rtl else pango.Alignment.LEFT
+        if max_width is not None:
+            layout.width = pango.units_from_double(max_width)
+            layout.wrap = pango.WrapMode.WORD
+        return layout
+
+    def render(self, text, font_path, font_size, is_rtl=False, max_width=None, h_pad=40, is_draw_bg=False,
+               bg_color=(0, 0, 0, 0), fill="white"):
+        cairo, pango = self.cairo, self.pango
+
+        # Measure on a scratch surface, then render onto one of the final size
+        scratch = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1))
+        measure_layout = self._make_layout(scratch, text, font_path, font_size, is_rtl, max_width)
+        _, logical = measure_layout.get_extents()
+        text_width = int(pango.units_to_double(logical.width)) + 1
+        text_height = int(pango.units_to_double(logical.height)) + 1
+        line_count = measure_layout.get_line_count()
+        extra_height = text_height - text_height // line_count
+
+        canvas_width = text_width + 40
+        canvas_height = text_height + h_pad
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, canvas_width, canvas_height)
+        ctx = cairo.Context(surface)
+
+        ctx.set_source_rgba(*(c / 255 for c in bg_color))
+        ctx.paint()
+        if is_draw_bg:
+            self._rounded_rectangle(ctx, canvas_width, canvas_height, BOX_RADIUS)
+            ctx.set_source_rgba(*(c / 255 for c in BOX_COLOR))
+            ctx.fill()
+
+        layout = self._make_layout(ctx, text, font_path, font_size, is_rtl, max_width)
+        if max_width is not None:
+            # Alignment inside the wrap width; shift so the text box starts at the padding
+            ctx.move_to(10 - pango.units_to_double(logical.x), 10)
+        else:
+            ctx.move_to(10, 10)
+        ctx.set_source_rgba(*(c / 255 for c in ImageColor.getcolor(fill, "RGBA")))
+        self.pangocairo.show_layout(ctx, layout)
+        surface.flush()
+
+        # Zero-copy view onto the surface (rows may be padded to the stride)
+        stride = surface.get_stride()
+        buffer = np.ndarray(shape=(canvas_height, stride // 4, 4), dtype=np.uint8, buffer=surface.get_data())
+        channel_order = "BGRA" if np.little_endian else "ARGB"
+        return Sprite(buffer[:, :canvas_width], channel_order=channel_order, premultiplied=True,
+                      extra_height=extra_height, owner=surface)
+
+    @staticmethod
+    def _rounded_rectangle(ctx, width, height, radius):
+        ctx.new_sub_path()
+        ctx.arc(width - radius, radius, radius, -np.pi / 2, 0)
+        ctx.arc(width - radius, height - radius, radius, 0, np.pi / 2)
+        ctx.arc(radius, height - radius, radius, np.pi / 2, np.pi)
+        ctx.arc(radius, radius, radius, np.pi, 3 * np.pi / 2)
+        ctx.close_path()
+
+
+class CachedRenderer(TextRenderer):
+    """Wraps a renderer so each distinct text, font and layout is rendered once
+
+    For several videos built from the same verses (see variant_render):
+    variants sharing a width reuse each other's sprites.
+    """
+
+    def __init__(self, renderer):
+        self.renderer = renderer
+        self.name = renderer.name
+        self.sprites = {}
+
+    def render(self, text, font_path, font_size, is_rtl=False, max_width=None, h_pad=40, is_draw_bg=False,
+               bg_color=(0, 0, 0, 0), fill="white"):
+        key = (text, font_path, font_size, is_rtl, max_width, h_pad, is_draw_bg, tuple(bg_color), fill)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.sprites[key] = self.renderer.render(text, font_path, font_size, is_rtl=is_rtl,
+                                                              max_width=max_width, h_pad=h_pad,
+                                                              is_draw_bg=is_draw_bg, bg_color=bg_color, fill=fill)
+        return sprite
+
+
+def get_renderer(name=DEFAULT_TEXT_RENDERER, shaping_backend=DEFAULT_SHAPING_BACKEND):
+    """Create the text renderer selected by name"""
+    if name == "pil":
+        return PilTextRenderer(shaping_backend)
+    if name == "cairo":
+        return CairoTextRenderer()
+    raise ValueError(f"Unknown text renderer '{name}', expected one of {TEXT_RENDERERS}")
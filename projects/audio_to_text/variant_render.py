@@ -0,0 +1,62 @@
+import time
+
+from ffmpeg_io import FrameWriter, SplitBackgroundReader, encoder_args
+from frame_compositor import PROGRESS_EVERY, make_compositor
+
+
+class Variant:
+    """One published cut of a surah: frame size (aspect ratio) and the translation shown under the Arabic
+
+    ``translation`` is the verse field of the surah JSON the subtitles read (see generate_srt).
+    """
+
+    def __init__(self, name, size, translation="en_text"):
+        self.name = name
+        self.size = tuple(size)
+        self.translation = translation
+
+
+def render_variants(background_path, outputs, fps, duration, audio_path=None, loop_background=True,
+                    video_args=None, audio_output_args=None, pix_fmt="rgb24", cache_static=True):
+    """Render several variants of one video from a single decode of the background
+
+    ``outputs`` is a list of (output_path, size, cues). The background is
+    decoded once and split to every size (SplitBackgroundReader); each
+    variant has its own compositor and its own ffmpeg encoder, so the
+    encoders run side by side while this process composites. Returns the
+    measured frames per second (frames of every variant counted once).
+    """
+    sizes = [size for _, size, _ in outputs]
+    compositors = [make_compositor(cues, size, pix_fmt, cache_static) for _, size, cues in outputs]
+    reader = SplitBackgroundReader(background_path, sizes, fps, loop=loop_background, pix_fmt=pix_fmt)
+    writers = [FrameWriter(output_path, size, fps, audio_path=audio_path, pix_fmt=pix_fmt,
+                           video_args=video_args or encoder_args(), audio_output_args=audio_output_args)
+               for output_path, size, _ in outputs]
+
+    frame_count = int(round(duration * fps))
+    started = time.perf_counter()
+    next_progress = PROGRESS_EVERY
+    written = 0
+    try:
+        for idx in range(frame_count):
+            frames = reader.read()
+            if frames is None:
+                print(f"Background ended after {idx} of {frame_count} frames")
+                break
+            t = idx / fps
+            for frame, compositor, writer in zip(frames, compositors, writers):
+                writer.write(compositor.composite(frame, t))
+            written += 1
+            if t >= next_progress:
+                elapsed = time.perf_counter() - started
+                print(f"  {t:.0f}/{duration:.0f}s rendered in {len(outputs)} variants ({written / elapsed:.1f} fps)")
+                next_progress += PROGRESS_EVERY
+    finally:
+        reader.close()
+        for writer in writers:
+            writer.close()
+
+    elapsed = time.perf_counter() - started
+    measured_fps = written / elapsed if elapsed else 0.0
+    print(f"Composited {written} frames x {len(outputs)} variants in {elapsed:.1f}s ({measured_fps:.1f} fps)")
+    return measured_fps
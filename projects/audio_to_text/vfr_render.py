@@ -0,0 +1,95 @@
+import os
+import time
+
+import numpy as np
+
+from background_cache import open_background
+from clip_index import IntervalIndex
+from av_io import AvFrameWriter
+from ffmpeg_io import encoder_args, frame_shape
+from frame_compositor import PROGRESS_EVERY, make_compositor
+
+# --- CONFIGURATION ---
+STILL_IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+MAX_HOLD_SECONDS = 2.0  # Longest a frame is held, so players can still seek into long static stretches
+DEFAULT_BASE_FPS = 2.0  # Background frame rate of slow loops; cue animations keep the full rate
+
+
+def is_still_image(path):
+    return os.path.splitext(path)[1].lower() in STILL_IMAGE_EXTENSIONS
+
+
+def vfr_video_args(fps, preset=None, threads=None, keyframes=None):
+    """x264 arguments for VFR renders, whose frames mostly hold still text over a still or slow background"""
+    return encoder_args(preset=preset, threads=threads, tune="stillimage", keyframes=keyframes)
+
+
+def render_cues_vfr(background_path, cues, output_path, size, fps, duration, audio_path=None, loop_background=True,
+                    base_fps=DEFAULT_BASE_FPS, video_args=None, audio_output_args=None, pix_fmt="rgb24",
+                    cache_static=True, cache_background=False, max_hold=MAX_HOLD_SECONDS):
+    """render_cues for still or slow backgrounds: frames are only composited and encoded when something changes
+
+    A still image is decoded once; a video background is decoded at
+    ``base_fps`` and each frame held until the next. A frame is composited
+    only when the background frame, the set of active cues or an animating
+    cue changes, and only those frames are encoded: the PyAV writer gives
+    each one its own timestamp on the ``fps`` grid, so the previous frame
+    is simply held. Cue reveals stay at full fps and the rest of the
+    recitation costs a few frames per second, with no pipe copy, colour
+    conversion or encode for repeated frames. A frame is still written
+    every ``max_hold`` seconds so players can seek into long static stretches.
+    Returns the number of composited frames.
+    """
+    still = is_still_image(background_path)
+    background_fps = fps if base_fps is None else min(base_fps, fps)
+    reader = open_background(background_path, size, background_fps, loop=loop_background and not still,
+                             pix_fmt=pix_fmt, cache=cache_background)
+    writer = AvFrameWriter(output_path, size, fps, audio_path=audio_path, pix_fmt=pix_fmt,
+                           video_args=video_args or vfr_video_args(fps), audio_output_args=audio_output_args)
+    compositor = make_compositor(cues, size, pix_fmt, cache_static)
+    index = IntervalIndex(cues)
+    frame = np.empty(frame_shape(size, pix_fmt), dtype=np.uint8)
+
+    frame_count = int(round(duration * fps))
+    background, background_idx = None, -1
+    drawn_cues = None
+    composited = 0
+    max_hold_frames = max(int(max_hold * fps), 1)
+    last_written = -max_hold_frames
+    started = time.perf_counter()
+    next_progress = PROGRESS_EVERY
+    try:
+        for idx in range(frame_count):
+            t = idx / fps
+            changed = False
+            wanted = 0 if still else int(t * background_fps + 1e-9)
+            while background_idx < wanted:
+                background = reader.read()
+                if background is None:
+                    raise RuntimeError(f"Background ended at {t:.2f}s of {duration:.2f}s")
+                background_idx += 1
+                changed = True
+
+            active = index.active(t)
+            if changed or active != drawn_cues or any(cue.is_animating(t) for cue in active):
+                np.copyto(frame, background)
+                compositor.composite(frame, t)
+                drawn_cues = active
+                composited += 1
+                changed = True
+            # The last frame is written too, so the video lasts as long as the audio
+            if changed or idx - last_written >= max_hold_frames or idx == frame_count - 1:
+                writer.write(frame, frame_no=idx)
+                last_written = idx
+            if t >= next_progress:
+                elapsed = time.perf_counter() - started
+                print(f"  {t:.0f}/{duration:.0f}s rendered ({idx / elapsed:.1f} fps, {composited} composited)")
+                next_progress += PROGRESS_EVERY
+    finally:
+        reader.close()
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Composited {composited} of {frame_count} frames in {elapsed:.1f}s "
+          f"({frame_count / elapsed if elapsed else 0.0:.1f} fps effective)")
+    return composited
@@ -12,6 +12,8 @@ from bidi.algorithm import get_display
 from moviepy import *
 import ffmpeg
 import argparse # Import the argparse module
+from clip_index import IndexedCompositeVideoClip
+from encoder_profile import moviepy_write_kwargs
 
 
 # --- CONFIGURATION ---
@@ -373,14 +375,14 @@ def main():
         video = VideoFileClip(TEMP_MERGED_PATH)
         subs = pysrt.open(SUBS_PATH)
         subtitle_clips = create_subtitle_clips(video, subs, font_english, font_arabic)
-        final = CompositeVideoClip([video] + subtitle_clips)
+        final = IndexedCompositeVideoClip([video] + subtitle_clips)
         final.write_videofile(
             OUTPUT_VIDEO_PATH,
             fps=video.fps,
             codec="libx264",
             audio_codec="aac",
-            threads=4,
-            preset="medium"
+            # Preset, threads, CRF and tune from this host's encoder profile, 4 threads without one
+            **moviepy_write_kwargs(defaults={"threads": 4})
         )
         print(f"Final video created at {OUTPUT_VIDEO_PATH}")
 
@@ -13,6 +13,7 @@ from moviepy import *
 from moviepy.video.fx import FadeIn, FadeOut
 import ffmpeg
 import argparse
+from encoder_profile import moviepy_write_kwargs
 
 # --- CONFIGURATION ---
 # Base paths that will be formatted with the surah number
@@ -787,8 +788,8 @@ def main():
             fps=video.fps,
             codec="libx264",
             audio_codec="aac",
-            threads=8,
-            preset="medium"
+            # Preset, threads, CRF and tune from this host's encoder profile, 8 threads without one
+            **moviepy_write_kwargs(defaults={"threads": 8})
         )
         print(f"Final video created at {OUTPUT_VIDEO_PATH}")
 
@@ -0,0 +1,126 @@
+import unicodedata
+
+import numpy as np
+
+from animation import Cue
+from text_layout import DEFAULT_SHAPING_BACKEND, LINE_GAP
+from text_renderer import CachedRenderer, PilTextRenderer
+
+# --- CONFIGURATION ---
+HIGHLIGHT_COLOR = "#FFD54F"
+NORMAL_COLOR = "white"
+SPAN_PADDING = 2  # Widen each word's column span to cover glyph overhang
+
+
+def _is_word_cluster(cluster):
+    """A cluster that belongs to a word: not a space and carrying a base letter (pause marks alone don't count)"""
+    return not cluster[0].isspace() and not all(unicodedata.combining(c) for c in cluster)
+
+
+def word_spans(sprite):
+    """Pixel rectangles (y0, y1, x0, x1) of every word of a PIL-rendered sprite, in reading order
+
+    Column spans come straight from the layout's cluster advance prefix sums,
+    rows from the band each wrapped line occupies.
+    """
+    layout = sprite.layout
+    positions = sprite.line_positions
+    line_count = len(layout.lines)
+    spans = []
+    for line_idx, (line, (x_pos, y_pos)) in enumerate(zip(layout.lines, positions)):
+        y0 = 0 if line_idx == 0 else int(y_pos - LINE_GAP // 2)
+        y1 = sprite.height if line_idx == line_count - 1 else int(positions[line_idx + 1][1] - LINE_GAP // 2)
+
+        word_start = None
+        for k, cluster in enumerate(line.clusters + [" "]):
+            in_word = _is_word_cluster(cluster) or (word_start is not None and not cluster[0].isspace())
+            if in_word and word_start is None:
+                word_start = k
+            elif not in_word and word_start is not None:
+                a, b = line.prefix_width(word_start), line.prefix_width(k)
+                if layout.is_rtl:
+                    right = x_pos + line.width
+                    x0, x1 = right - b, right - a
+                else:
+                    x0, x1 = x_pos + a, x_pos + b
+                x0 = max(int(x0) - SPAN_PADDING, 0)
+                x1 = min(int(np.ceil(x1)) + SPAN_PADDING, sprite.width)
+                spans.append((y0, y1, x0, x1))
+                word_start = None
+    return spans
+
+
+def build_word_timeline(segments, cue_start_ms):
+    """Sorted (starts, ends, word positions) in seconds relative to the cue from verse_timings segments
+
+    Segments look like [word_position, from_ms, to_ms] with 1-based word
+    positions; incomplete entries such as [1] are skipped.
+    """
+    rows = sorted((s[1], s[2], s[0]) for s in segments if len(s) == 3)
+    if not rows:
+        return np.zeros(0), np.zeros(0), np.zeros(0, dtype=int)
+    starts, ends, words = (np.array(column) for column in zip(*rows))
+    return (starts - cue_start_ms) / 1000.0, (ends - cue_start_ms) / 1000.0, words.astype(int) - 1
+
+
+def word_index_at(times, starts, ends, words):
+    """Vectorized time -> 0-based word index lookup, -1 where no word is being recited"""
+    times = np.atleast_1d(np.asarray(times, dtype=float))
+    if len(starts) == 0:
+        return np.full(times.shape, -1)
+    idx = np.searchsorted(starts, times, side="right") - 1
+    safe = np.clip(idx, 0, len(starts) - 1)
+    active = (idx >= 0) & (times < ends[safe])
+    return np.where(active, words[safe], -1)
+
+
+def create_word_highlight_animation(text, font_path, font_size, segments, cue_start_ms, duration, is_rtl=True,
+                                    max_width=None, h_pad=60, is_draw_bg=True, renderer=None, fps=None, animation=None,
+                                    shaping_backend=DEFAULT_SHAPING_BACKEND):
+    """Cue clip that highlights the word currently being recited
+
+    The cue is rasterized once in the normal and once in the highlight colour.
+    A frame buffer starts as the normal sprite; when the active word changes
+    the old word's rectangle is restored from the normal sprite and the new
+    one copied from the highlight sprite, so frames in between cost nothing.
+    Returns (cue, canvas_width, canvas_height, extra_height); ``animation`` adds wipe/fade transforms.
+    """
+    # Word spans need the PIL layout's cluster advances, other renderers fall back to PIL with the same shaping
+    inner = renderer.renderer if isinstance(renderer, CachedRenderer) else renderer
+    if not isinstance(inner, PilTextRenderer):
+        renderer = PilTextRenderer(shaping_backend)
+    render_args = dict(is_rtl=is_rtl, max_width=max_width, h_pad=h_pad, is_draw_bg=is_draw_bg)
+    normal = renderer.render(text, font_path, font_size, fill=NORMAL_COLOR, **render_args)
+    highlight = renderer.render(text, font_path, font_size, fill=HIGHLIGHT_COLOR, **render_args)
+    normal_array, highlight_array = normal.to_rgba(), highlight.to_rgba()
+
+    spans = word_spans(normal)
+    starts, ends, words = build_word_timeline(segments, cue_start_ms)
+    words = np.where(words < len(spans), words, -1)
+
+    # With a known fps the whole cue's word table is computed up front
+    frame_words = None
+    if fps:
+        frame_words = word_index_at(np.arange(int(np.ceil(duration * fps)) + 1) / fps, starts, ends, words)
+
+    frame = normal_array.copy()
+    current = [-1]
+
+    def make_frame(t):
+        if frame_words is not None:
+            word = frame_words[min(int(round(t * fps)), len(frame_words) - 1)]
+        else:
+            word = word_index_at(t, starts, ends, words)[0]
+
+        if word != current[0]:
+            if current[0] >= 0:
+                y0, y1, x0, x1 = spans[current[0]]
+                frame[y0:y1, x0:x1] = normal_array[y0:y1, x0:x1]
+            if word >= 0:
+                y0, y1, x0, x1 = spans[word]
+                frame[y0:y1, x0:x1] = highlight_array[y0:y1, x0:x1]
+            current[0] = word
+        return frame
+
+    cue = Cue(normal, animation, duration=duration, frame_source=make_frame, name=text[:40])
+    return cue, normal.width, normal.height, normal.extra_height
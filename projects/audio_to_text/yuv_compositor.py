@@ -0,0 +1,131 @@
+import numpy as np
+
+from clip_index import BUCKET_SECONDS, IntervalIndex
+
+# --- CONFIGURATION ---
+# BT.601 limited range, what swscale uses by default when the RGB path converts to yuv420p for libx264
+RGB_TO_YUV = np.array([[65.481, 128.553, 24.966],
+                       [-37.797, -74.203, 112.0],
+                       [112.0, -93.786, -18.214]], dtype=np.float32) / 255.0
+YUV_OFFSET = np.array([16.0, 128.0, 128.0], dtype=np.float32)
+
+
+def yuv420p_planes(frame, size):
+    """(Y, U, V) plane views of a flat yuv420p frame buffer
+
+    Chroma planes round odd dimensions up, like ffmpeg's (-w >> 1) sizing.
+    """
+    w, h = size
+    luma = w * h
+    chroma_w, chroma_h = (w + 1) // 2, (h + 1) // 2
+    chroma = chroma_w * chroma_h
+    return (frame[:luma].reshape(h, w),
+            frame[luma:luma + chroma].reshape(chroma_h, chroma_w),
+            frame[luma + chroma:luma + 2 * chroma].reshape(chroma_h, chroma_w))
+
+
+class YuvSprite:
+    """A cue sprite converted once to premultiplied Y/U/V planes with matching alpha planes
+
+    Luma keeps the sprite's resolution; chroma and its alpha are averaged
+    over 2x2 blocks (colour weighted by alpha), matching yuv420p. The sprite
+    is padded to even dimensions so it always lines up with the chroma grid.
+    """
+
+    def __init__(self, rgba):
+        h, w = rgba.shape[:2]
+        padded = np.zeros((h + h % 2, w + w % 2, 4), dtype=np.float32)
+        padded[:h, :w] = rgba
+        rgb, alpha = padded[..., :3], padded[..., 3] / 255.0
+
+        yuv = rgb @ RGB_TO_YUV.T + YUV_OFFSET
+        self.y = np.rint(yuv[..., 0] * alpha).astype(np.uint16)
+        self.y_alpha = np.rint(alpha * 255.0).astype(np.uint16)
+
+        # 2x2 block sums of alpha and alpha-weighted colour
+        block_alpha = alpha.reshape(h // 2 + h % 2, 2, -1, 2).sum(axis=(1, 3))
+        block_yuv = (yuv[..., 1:] * alpha[..., None]).reshape(h // 2 + h % 2, 2, -1, 2, 2).sum(axis=(1, 3))
+        chroma_alpha = block_alpha / 4.0
+        chroma = block_yuv / np.maximum(block_alpha, 1e-6)[..., None]
+        self.u = np.rint(chroma[..., 0] * chroma_alpha).astype(np.uint16)
+        self.v = np.rint(chroma[..., 1] * chroma_alpha).astype(np.uint16)
+        self.uv_alpha = np.rint(chroma_alpha * 255.0).astype(np.uint16)
+
+    @property
+    def width(self):
+        return self.y.shape[1]
+
+    @property
+    def height(self):
+        return self.y.shape[0]
+
+    @staticmethod
+    def _blend_plane(target, premultiplied, alpha, scale):
+        """target = premultiplied + target * (255 - alpha) / 255, opacity applied as scale / 256"""
+        if scale < 256:
+            premultiplied = (premultiplied * scale) >> 8
+            alpha = (alpha * scale) >> 8
+        target[...] = np.minimum(premultiplied + (target * (255 - alpha) + 127) // 255, 255)
+
+    def blend_onto(self, planes, x, y, c0, c1, opacity=1.0):
+        """Blend sprite columns [c0, c1) into yuv420p planes in place at even screen position (x, y)"""
+        plane_y, plane_u, plane_v = planes
+        frame_h, frame_w = plane_y.shape
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + c1 - c0, frame_w), min(y + self.height, frame_h)
+        if x0 >= x1 or y0 >= y1 or opacity <= 0:
+            return planes
+
+        scale = int(round(min(opacity, 1.0) * 256))
+        sx, sy = c0 + x0 - x, y0 - y
+        luma = (slice(sy, sy + y1 - y0), slice(sx, sx + x1 - x0))
+        self._blend_plane(plane_y[y0:y1, x0:x1], self.y[luma], self.y_alpha[luma], scale)
+
+        # x0, y0, sx and sy are even, so an odd last row or column still maps to one whole chroma sample
+        chroma = (slice(sy // 2, (sy + y1 - y0 + 1) // 2), slice(sx // 2, (sx + x1 - x0 + 1) // 2))
+        target = (slice(y0 // 2, (y1 + 1) // 2), slice(x0 // 2, (x1 + 1) // 2))
+        self._blend_plane(plane_u[target], self.u[chroma], self.uv_alpha[chroma], scale)
+        self._blend_plane(plane_v[target], self.v[chroma], self.uv_alpha[chroma], scale)
+        return planes
+
+
+class YuvCue:
+    """A Cue blended in the yuv420p domain: positions and wipe columns snap to the 2x2 chroma grid"""
+
+    def __init__(self, cue):
+        self.cue = cue
+        self.start, self.end = cue.start, cue.end
+        self.sprite = None if cue.frame_source is not None else YuvSprite(cue.rgba(0.0))
+
+    def blend_onto(self, planes, t):
+        cue = self.cue
+        ct = t - cue.start
+        (c0, c1), x, y, opacity = cue.state(ct)
+        c0, c1 = c0 & ~1, c1 + c1 % 2
+        if c1 <= c0 or opacity <= 0:
+            return planes
+        # Cues whose pixels change over time (word highlighting) are converted per frame, only their own box
+        sprite = self.sprite or YuvSprite(cue.rgba(ct))
+        x = int(x - cue.animation.visible_columns(ct, cue.width)[0] + c0)
+        return sprite.blend_onto(planes, x & ~1, int(y) & ~1, c0, min(c1, sprite.width), opacity)
+
+
+class YuvFrameCompositor:
+    """Blends cues directly onto the decoder's planar yuv420p frames
+
+    Sprites are converted to premultiplied Y/U/V planes once, so a frame
+    never goes through RGB: the background is decoded to yuv420p, blended
+    plane by plane inside each cue's box and handed to the encoder as is.
+    """
+
+    def __init__(self, cues, frame_size, bucket_seconds=BUCKET_SECONDS):
+        self.frame_size = tuple(frame_size)
+        self.cues = [YuvCue(cue) for cue in cues]
+        self.index = IntervalIndex(self.cues, bucket_seconds)
+        self.overlay_builds = 0  # Same report line as FrameCompositor
+
+    def composite(self, frame, t):
+        planes = yuv420p_planes(frame, self.frame_size)
+        for cue in self.index.active(t):
+            cue.blend_onto(planes, t)
+        return frame